@@ -0,0 +1,344 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure benchmarks
+
+Runs the measure_core kernels on synthetic meshes outside of Blender
+and reports the throughput (faces/s) and the peak memory of every
+case.
+
+Meshes (--shapes):
+    sphere  UV sphere (quads, triangles at the poles).
+    cube    Subdivided cube (welded quads, closed).
+    soup    Random n-gon soup (3 to 8 vertices per face, not closed).
+
+Cases: area and volume in local and global space, and the area of a
+random face selection (mask).
+
+Usage:
+    python bench_measure.py
+    python bench_measure.py --sizes 1000 10000000 --shapes sphere
+    python bench_measure.py --save baseline.json
+    python bench_measure.py --compare baseline.json --tolerance 0.25
+    python bench_measure.py --extras
+
+--compare exits with status 1 if any case is slower (faces/s) or uses
+more peak memory than the baseline by more than the tolerance.
+Baselines are only comparable on the same machine.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+import measure_core
+
+
+# Default mesh sizes (faces). Up to 10M faces with --sizes.
+SIZES = (1000, 10000, 100000, 1000000)
+
+# Seed of the random meshes and selections.
+SEED = 1
+
+
+# Create a UV sphere with about "faces" faces.
+# The poles are made of triangles, everything else are quads.
+def uvSphere(faces, radius=1.0):
+    rings = max(int((faces / 2) ** 0.5), 3)
+    segments = max(faces // rings, 3)
+
+    theta = numpy.linspace(0.0, numpy.pi, rings + 1)[1:-1]
+    phi = numpy.linspace(0.0, 2.0 * numpy.pi, segments, endpoint=False)
+    t, p = numpy.meshgrid(theta, phi, indexing="ij")
+    ring = numpy.column_stack([
+        (numpy.sin(t) * numpy.cos(p)).ravel(),
+        (numpy.sin(t) * numpy.sin(p)).ravel(),
+        numpy.cos(t).ravel()])
+    coords = numpy.vstack([[0.0, 0.0, 1.0], ring, [0.0, 0.0, -1.0]]) * radius
+    south = len(coords) - 1
+
+    # Index of vertex (ring r, segment s).
+    r = numpy.arange(rings - 2)[:, None]
+    s = numpy.arange(segments)[None, :]
+    sn = (s + 1) % segments
+    quads = numpy.stack([
+        1 + r * segments + s,
+        1 + (r + 1) * segments + s,
+        1 + (r + 1) * segments + sn,
+        1 + r * segments + sn], axis=-1).reshape(-1, 4)
+
+    s = numpy.arange(segments)
+    sn = (s + 1) % segments
+    top = numpy.column_stack([numpy.zeros_like(s), 1 + s, 1 + sn])
+    last = 1 + (rings - 2) * segments
+    bottom = numpy.column_stack([numpy.full_like(s, south), last + sn, last + s])
+
+    loops = numpy.concatenate([top.ravel(), quads.ravel(), bottom.ravel()])
+    sizes = numpy.concatenate([
+        numpy.full(len(top), 3), numpy.full(len(quads), 4),
+        numpy.full(len(bottom), 3)])
+    return coords.astype(numpy.float32), loops.astype(numpy.int32), sizes
+
+
+# Create a cube [-size, size]^3 with each side subdivided into n x n
+# quads (6 * n^2 faces, about "faces"). The vertices on the edges of
+# the sides are welded, so the mesh is closed.
+def subdividedCube(faces, size=1.0):
+    n = max(int(round((faces / 6.0) ** 0.5)), 1)
+    i, j = numpy.meshgrid(numpy.arange(n + 1), numpy.arange(n + 1),
+        indexing="ij")
+    i, j = i.ravel(), j.ravel()
+    lo, hi = numpy.zeros_like(i), numpy.full_like(i, n)
+
+    # Grid points of each side, as integer coordinates. The order of
+    # the axes makes the quads of every side face outwards.
+    sides = [
+        (i, j, lo), (j, i, hi),
+        (j, lo, i), (i, hi, j),
+        (lo, i, j), (hi, j, i)]
+    grid = numpy.concatenate([numpy.column_stack(side) for side in sides])
+
+    # Weld the shared edge/corner points.
+    keys = (grid[:, 0] * (n + 1) + grid[:, 1]) * (n + 1) + grid[:, 2]
+    keys, index = numpy.unique(keys, return_inverse=True)
+    coords = numpy.column_stack([
+        keys // ((n + 1) * (n + 1)), (keys // (n + 1)) % (n + 1),
+        keys % (n + 1)])
+    coords = coords * (2.0 * size / n) - size
+
+    # Quads of one side (grid point (a, b) is a * (n + 1) + b).
+    a, b = numpy.meshgrid(numpy.arange(n), numpy.arange(n), indexing="ij")
+    corner = (a * (n + 1) + b).ravel()
+    quad = numpy.column_stack([
+        corner, corner + 1, corner + (n + 2), corner + (n + 1)])
+    offsets = numpy.arange(6)[:, None, None] * (n + 1) * (n + 1)
+    loops = index.ravel()[(quad[None] + offsets).ravel()]
+
+    sizes = numpy.full(6 * n * n, 4)
+    return coords.astype(numpy.float32), loops.astype(numpy.int32), sizes
+
+
+# Create "faces" random planar convex n-gons (3 to 8 vertices) with
+# random positions, orientations and sizes. Every face has its own
+# vertices.
+def ngonSoup(faces, seed=SEED):
+    random = numpy.random.RandomState(seed)
+    sizes = random.randint(3, 9, faces)
+    face = numpy.repeat(numpy.arange(faces), sizes)
+    corner = numpy.arange(len(face)) - numpy.repeat(
+        measure_core.faceStarts(sizes), sizes)
+
+    centres = random.uniform(-10.0, 10.0, (faces, 3))
+    radii = random.uniform(0.01, 0.5, faces)
+    u = random.normal(size=(faces, 3))
+    u /= numpy.linalg.norm(u, axis=1)[:, None]
+    v = numpy.cross(u, random.normal(size=(faces, 3)))
+    v /= numpy.linalg.norm(v, axis=1)[:, None]
+
+    angle = 2.0 * numpy.pi * corner / sizes[face]
+    coords = centres[face] + radii[face, None] * (
+        numpy.cos(angle)[:, None] * u[face]
+        + numpy.sin(angle)[:, None] * v[face])
+    loops = numpy.arange(len(face))
+    return coords.astype(numpy.float32), loops.astype(numpy.int32), sizes
+
+
+SHAPES = {
+    "sphere": uvSphere,
+    "cube": subdividedCube,
+    "soup": ngonSoup}
+
+
+# Object to world matrix of the "global" cases (not a similarity).
+def globalMatrix():
+    matrix = numpy.diag([2.0, 3.0, 0.5, 1.0])
+    matrix[:3, 3] = (10.0, -4.0, 2.0)
+    return matrix
+
+
+# The benchmark cases: (name, function(coords, loops, sizes, mask, matrix)).
+CASES = (
+    ("area_local", lambda c, l, s, mask, m:
+        measure_core.surfaceArea(c, l, s)),
+    ("area_global", lambda c, l, s, mask, m:
+        measure_core.surfaceArea(c, l, s, matrix=m)),
+    ("volume_local", lambda c, l, s, mask, m:
+        measure_core.signedVolume(c, l, s)),
+    ("volume_global", lambda c, l, s, mask, m:
+        measure_core.signedVolume(c, l, s, matrix=m)),
+    ("area_mask", lambda c, l, s, mask, m:
+        measure_core.surfaceArea(c, l, s, mask=mask, matrix=m)))
+
+
+# Run func(*args) and return (seconds, peak bytes allocated).
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+# Minimum total run time of one case (seconds), for stable timings
+# of small meshes.
+MIN_TIME = 0.25
+
+
+# Return the best time of at least "repeat" runs of func(*args)
+# (without tracemalloc, which slows down allocations) and the peak
+# memory of one traced run.
+def timeCase(func, args, repeat):
+    best = None
+    total = 0.0
+    runs = 0
+    while runs < repeat or total < MIN_TIME:
+        start = time.perf_counter()
+        func(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        total += seconds
+        runs += 1
+    peak = measure(func, *args)[1]
+    return best, peak
+
+
+# Run all cases on all shapes and sizes. Returns a dict
+# {"shape/faces/case": {"faces_per_s": .., "peak_bytes": ..}}.
+def runSuite(shapes, sizes, repeat=3, log=sys.stdout):
+    results = {}
+    matrix = globalMatrix()
+    for shape in shapes:
+        for faces in sizes:
+            coords, loops, sizes_ = SHAPES[shape](faces)
+            mask = numpy.random.RandomState(SEED).rand(len(sizes_)) < 0.5
+            args = (coords, loops, sizes_, mask, matrix)
+            for name, func in CASES:
+                seconds, peak = timeCase(func, args, repeat)
+                key = "%s/%d/%s" % (shape, faces, name)
+                results[key] = {
+                    "faces": len(sizes_),
+                    "faces_per_s": len(sizes_) / seconds,
+                    "peak_bytes": peak}
+                log.write("%-28s %9d faces %8.4f s %14.1f faces/s"
+                    "  peak %8.1f MiB\n" % (key, len(sizes_), seconds,
+                        len(sizes_) / seconds, peak / 1048576.0))
+                log.flush()
+    return results
+
+
+# Compare results with a baseline. Returns the list of regressions
+# (one line per case).
+def compareResults(results, baseline, tolerance):
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        speed = result["faces_per_s"] / base["faces_per_s"]
+        if speed < 1.0 - tolerance:
+            regressions.append("%s: %.1f%% slower (%.1f -> %.1f faces/s)" % (
+                key, 100.0 * (1.0 - speed), base["faces_per_s"],
+                result["faces_per_s"]))
+        # Ignore small absolute differences of small meshes.
+        limit = max(base["peak_bytes"] * (1.0 + tolerance),
+            base["peak_bytes"] + 1048576)
+        if result["peak_bytes"] > limit:
+            regressions.append("%s: peak memory %.1f -> %.1f MiB" % (
+                key, base["peak_bytes"] / 1048576.0,
+                result["peak_bytes"] / 1048576.0))
+    return regressions
+
+
+# Precise vs. fast mode and the batch API with a growing number of
+# threads.
+def runExtras(faces):
+    coords, loops, sizes = uvSphere(faces)
+
+    # Precise mode, on a mesh far away from the origin.
+    far = coords.astype(numpy.float64) + (2.5e6, -1.2e6, 350.0)
+    fast, peak = measure(measure_core.areaAndVolume, far, loops, sizes)
+    precise, peak = measure(measure_core.preciseAreaAndVolume,
+        far, loops, sizes)
+    print("precise %8.3f s  fast %8.3f s  ratio %.2f" % (
+        precise, fast, precise / fast))
+    print("  fast    volume %r" % (
+        measure_core.areaAndVolume(far, loops, sizes)[1],))
+    print("  precise volume %r +- %.3g" % measure_core.preciseAreaAndVolume(
+        far, loops, sizes)[1::2])
+
+    # Many small meshes, measured with a growing number of threads.
+    count = 1000
+    small = [uvSphere(2000) + (None,) for i in range(count)]
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        measure_core.measureBatch(small, workers=workers)
+        seconds = time.perf_counter() - start
+        print("batch  %4d meshes %d workers %8.3f s" % (
+            count, workers, seconds))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the measure_core kernels.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+        help="Mesh sizes in faces (default: %s)." % " ".join(
+            str(s) for s in SIZES))
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES),
+        default=sorted(SHAPES), help="Synthetic meshes to measure.")
+    parser.add_argument("--repeat", type=int, default=3,
+        help="Runs per case, the best time is used.")
+    parser.add_argument("--save",
+        help="Write the results to a JSON baseline file.")
+    parser.add_argument("--compare",
+        help="Compare the results with a JSON baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+        help="Allowed relative regression for --compare.")
+    parser.add_argument("--extras", action="store_true",
+        help="Also run the precise mode and batch benchmarks.")
+    args = parser.parse_args(argv[1:])
+
+    results = runSuite(args.shapes, args.sizes, args.repeat)
+
+    if args.extras:
+        runExtras(max(args.sizes))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+        print("No regressions (tolerance %d%%)." % (100 * args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
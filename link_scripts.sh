@@ -7,5 +7,11 @@ else
 fi
 cd "${app}/Contents/MacOS/.blender/scripts/modules"
 ln -s "${tmp}/volume.py"
+ln -s "${tmp}/measure_cache.py"
+ln -s "${tmp}/measure_core.py"
+ln -s "${tmp}/measure_spatial.py"
+ln -s "${tmp}/measure_io.py"
+ln -s "${tmp}/measure_topology.py"
+ln -s "${tmp}/measure_api.py"
 cd ../ui
 ln -s "${tmp}/panel_measure.py"
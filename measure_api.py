@@ -0,0 +1,164 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure API
+
+Stable entry point for measurements outside of the panel (exporters,
+render farm scripts, volume.py). The panel uses it as well. Does not
+depend on bpy, Blender objects are only read through the duck-typed
+helpers of measure_core.
+
+Bulk functions take arrays (or sequences of meshes) and return
+arrays. All of them accept a preallocated float64 "out" array of the
+right shape, which is filled and returned, so batch callers do not
+allocate per call:
+
+    meshes = [measure_api.meshBuffers(o.data) for o in objs]
+    matrices = [measure_api.objectMatrix(o) for o in objs]
+    out = numpy.empty(len(objs))
+    measure_api.volumes(meshes, matrices, out=out)
+
+A mesh is a (coords, loops, sizes) tuple, see measure_core.py.
+Matrices are 4x4 object to world matrices (column vectors), None
+means local space.
+"""
+
+import numpy
+
+import measure_core
+import measure_spatial
+
+# Stable names of the readers, kernels and indexes used by the panel,
+# and of the parallel batch measurement (measureBatch) for scripts.
+from measure_core import (meshBuffers, meshSize, meshFingerprint,
+    objectMatrix, selectedVertices, faceSelection, sameBuffers,
+    isSimilarity, SharedMesh, SelectionArea, massProperties, combineMass,
+    measureBatch)
+from measure_spatial import (SpatialIndex, surfaceDistance, closestPairs,
+    objectLocations, objectBounds, localPoint, similarityScale)
+from measure_topology import MeshTopology
+
+
+# Return "out", or a new float64 array if it is None.
+# A given "out" has to be a float64 array of the expected shape.
+def output(out, shape):
+    if out is None:
+        return numpy.empty(shape, dtype=numpy.float64)
+    if out.shape != shape:
+        raise ValueError("out has shape %s, expected %s" % (
+            out.shape, shape))
+    if out.dtype != numpy.float64:
+        raise ValueError("out has dtype %s, expected float64" % out.dtype)
+    return out
+
+
+# Return item n of an optional sequence (matrices, masks).
+def item(values, n):
+    if values is None:
+        return None
+    return values[n]
+
+
+# Area of every face of one mesh, shape (F,).
+def faceAreas(coords, loops, sizes, matrix=None, out=None):
+    return measure_core.faceAreas(coords, loops, sizes, matrix,
+        output(out, (len(sizes),)))
+
+
+# Surface area of every mesh, shape (N,).
+# *) masks (optional): one boolean face mask (or None) per mesh,
+#    only faces where the mask is True are counted.
+def areas(meshes, matrices=None, masks=None, out=None):
+    out = output(out, (len(meshes),))
+    for n, (coords, loops, sizes) in enumerate(meshes):
+        out[n] = measure_core.surfaceArea(coords, loops, sizes,
+            item(masks, n), item(matrices, n))
+    return out
+
+
+# Signed volume of every mesh, shape (N,).
+def volumes(meshes, matrices=None, out=None):
+    out = output(out, (len(meshes),))
+    for n, (coords, loops, sizes) in enumerate(meshes):
+        out[n] = measure_core.signedVolume(coords, loops, sizes,
+            item(matrices, n))
+    return out
+
+
+# Surface area and signed volume of every mesh in one pass,
+# shape (N, 2).
+def areasAndVolumes(meshes, matrices=None, out=None):
+    out = output(out, (len(meshes), 2))
+    for n, (coords, loops, sizes) in enumerate(meshes):
+        out[n] = measure_core.areaAndVolume(coords, loops, sizes,
+            item(matrices, n))
+    return out
+
+
+# Area of many face selections of one mesh, shape (K,).
+# *) areas: face areas of the mesh (see faceAreas), shape (F,).
+# *) masks: boolean face masks, shape (K, F).
+# The face areas are calculated once, every selection is a single
+# matrix product.
+def maskedAreas(areas, masks, out=None):
+    masks = numpy.asarray(masks, dtype=bool)
+    return numpy.matmul(masks, areas, out=output(out, (len(masks),)))
+
+
+# Distance between corresponding points, shape (N,).
+def pointDistances(points1, points2, out=None):
+    diff = numpy.asarray(points1, dtype=numpy.float64) - points2
+    out = output(out, (len(diff),))
+    return numpy.sqrt(numpy.einsum("ij,ij->i", diff, diff), out=out)
+
+
+# Distances between all objects (origins, or bounding boxes with
+# lows & highs), shape (N, N). See measure_spatial.distanceMatrix.
+def distanceMatrix(points=None, lows=None, highs=None, out=None):
+    if points is not None:
+        count = len(points)
+    else:
+        count = len(lows)
+    return measure_spatial.distanceMatrix(points, lows, highs,
+        output(out, (count, count)))
+
+
+# Return the mesh arrays of Blender mesh objects.
+def objectMeshes(objs):
+    return [meshBuffers(o.data) for o in objs]
+
+
+# Return the object matrices of Blender objects (None for each one
+# in local space).
+def objectMatrices(objs, globalSpace=True):
+    if not globalSpace:
+        return None
+    return [objectMatrix(o) for o in objs]
+
+
+# Surface area of Blender mesh objects (Blender units), shape (N,).
+def objectAreas(objs, globalSpace=True, out=None):
+    return areas(objectMeshes(objs), objectMatrices(objs, globalSpace),
+        out=out)
+
+
+# Signed volume of Blender mesh objects (Blender units), shape (N,).
+def objectVolumes(objs, globalSpace=True, out=None):
+    return volumes(objectMeshes(objs), objectMatrices(objs, globalSpace),
+        out=out)
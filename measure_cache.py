@@ -0,0 +1,261 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Measure cache
+
+Result caching, background scheduling and profiling for the measure
+panel. Pure Python (no bpy, no NumPy), so the panel can load it at
+startup and import the NumPy kernels (measure_core.py) only when the
+first measurement is needed.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Return the memory used by a cached value in bytes: its "nbytes"
+# (NumPy arrays and the measure objects), summed up over tuples and
+# lists. Other values count as 0.
+def valueBytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(valueBytes(v) for v in value)
+    return getattr(value, "nbytes", 0)
+
+
+# Size limited cache for measurement results.
+# The least recently used entry is dropped once maxSize is reached,
+# or once the values use more than maxBytes (optional, see
+# valueBytes). The last entry is always kept, even if it is larger.
+# The keys have to contain everything the result depends on
+# (see measureKey in panel_measure.py).
+class MeasureCache(object):
+    def __init__(self, maxSize=1024, maxBytes=None):
+        self.maxSize = maxSize
+        self.maxBytes = maxBytes
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Re-insert to mark as most recently used.
+        self.items[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.nbytes -= self.sizes.pop(key, 0)
+        self.items[key] = value
+        self.sizes[key] = valueBytes(value)
+        self.nbytes += self.sizes[key]
+        while len(self.items) > 1 and (len(self.items) > self.maxSize
+                or (self.maxBytes is not None
+                    and self.nbytes > self.maxBytes)):
+            old = self.items.popitem(last=False)[0]
+            self.nbytes -= self.sizes.pop(old)
+
+    def clear(self):
+        self.items.clear()
+        self.sizes.clear()
+        self.nbytes = 0
+
+
+# Return the p-th percentile of sorted values (linear interpolation,
+# like numpy.percentile).
+def percentile(values, p):
+    pos = (len(values) - 1) * p / 100.0
+    i = int(pos)
+    if i + 1 >= len(values):
+        return values[-1]
+    return values[i] + (values[i + 1] - values[i]) * (pos - i)
+
+
+# Opt-in instrumentation: named timings (the last "size" values of
+# each, in a ring buffer) and counters. Everything is a no-op while
+# "enabled" is False, start() returns None then and stop() ignores it.
+class MeasureProfile(object):
+    def __init__(self, size=256):
+        self.size = size
+        self.enabled = False
+        self.timings = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.enabled:
+            return time.perf_counter()
+        return None
+
+    # Record the time since start (see start()) under "name".
+    def stop(self, name, start):
+        if start is not None:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            timings = self.timings.get(name)
+            if timings is None:
+                timings = self.timings[name] = deque(maxlen=self.size)
+            timings.append(seconds)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    # Wrap func, so every call is recorded under "name".
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return wrapper
+
+    # Return [(name, count, p50, p95)] of the recorded timings
+    # (seconds), sorted by name.
+    def summary(self):
+        with self.lock:
+            timings = [(name, sorted(values))
+                for name, values in sorted(self.timings.items())]
+        return [(name, len(values),
+                percentile(values, 50), percentile(values, 95))
+            for name, values in timings if values]
+
+    # Return the timings and counters as text lines (for a log).
+    def report(self):
+        lines = ["%-24s %5d  p50 %9.3f ms  p95 %9.3f ms" % (
+                name, count, 1000.0 * p50, 1000.0 * p95)
+            for name, count, p50, p95 in self.summary()]
+        with self.lock:
+            counters = sorted(self.counters.items())
+        lines += ["%-24s %d" % item for item in counters]
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+
+# Runs measurements on a pool of worker threads.
+# NumPy releases the GIL in the kernels, so the UI is not blocked.
+# Jobs only get array snapshots (see measure_core.meshBuffers), never Blender data.
+# Finished results are moved into the cache by collect(), which has
+# to be called from the main thread; readers only look at the cache.
+class MeasureScheduler(object):
+    def __init__(self, cache, workers=None):
+        self.cache = cache
+        self.workers = workers
+        self.executor = None
+        self.jobs = {}
+        self.finished = []
+        self.lock = threading.Lock()
+        # Set while there are finished results to collect.
+        self.ready = threading.Event()
+        # Optional MeasureProfile, jobs are timed as "job:<key[0]>".
+        self.profile = None
+
+    def isPending(self, key):
+        with self.lock:
+            return key in self.jobs
+
+    def pendingCount(self):
+        with self.lock:
+            return len(self.jobs)
+
+    # Start func(*args) in the background, unless a job with the same
+    # key is already running. The result is stored under "key" in
+    # the scheduler cache, or in "cache" if given.
+    def submit(self, key, func, *args, **kwargs):
+        cache = kwargs.get("cache", self.cache)
+        if self.profile is not None and self.profile.enabled:
+            kind = key[0] if isinstance(key, tuple) else key
+            func = self.profile.timed("job:%s" % (kind,), func)
+        with self.lock:
+            if key in self.jobs:
+                return
+            if self.executor is None:
+                # concurrent.futures is slow to import, it is only
+                # needed once there is something to measure.
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(self.workers)
+            future = self.executor.submit(func, *args)
+            self.jobs[key] = future
+        future.add_done_callback(
+            lambda future, key=key: self.done(key, future, cache))
+
+    def done(self, key, future, cache):
+        if future.cancelled():
+            return
+        try:
+            value = future.result()
+        except Exception:
+            # Measurement failed, same as "can not calculate".
+            value = -1
+        with self.lock:
+            if self.jobs.get(key) is future:
+                del self.jobs[key]
+                self.finished.append((key, value, cache))
+                self.ready.set()
+
+    # Move finished results into the cache.
+    # Returns the number of new results.
+    def collect(self):
+        with self.lock:
+            finished, self.finished = self.finished, []
+            self.ready.clear()
+        for key, value, cache in finished:
+            cache.put(key, value)
+        return len(finished)
+
+    # Wait until a result can be collected, at most "timeout" seconds.
+    # Returns True if there is one.
+    def wait(self, timeout):
+        return self.ready.wait(timeout)
+
+    # Cancel all jobs that have not been started yet.
+    # Results of running jobs are dropped.
+    def cancel(self):
+        with self.lock:
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs.clear()
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
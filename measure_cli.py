@@ -0,0 +1,317 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure CLI
+
+Measures the surface area and volume of every mesh in a set of files
+or directories, in local and global space, and streams the results
+to a JSONL or CSV file. Uses the same code as the measure panel
+(measure_core.py).
+
+Supported files: .obj, .ply, .npz, .stl (see measure_io.py) and
+.blend. .blend files are opened with a background Blender process
+(--blender), which runs this script again inside Blender.
+
+With --stream, .ply, .stl and .npy files are memory-mapped and
+measured chunk by chunk (local space only, plus the bounding box),
+for meshes that do not fit into memory. Files that can not be mapped
+(ASCII PLY, mixed face sizes) are read normally.
+
+Usage:
+    python measure_cli.py -o results.jsonl -j 8 assets/
+    python measure_cli.py -o results.csv --blender /usr/bin/blender assets/
+    python measure_cli.py -o scans.jsonl --stream scans/
+
+Files whose records are all in the output file are skipped, so an
+interrupted run can simply be started again (use --no-resume to
+start over). Whatever the interrupted run wrote after the last
+complete file is dropped first.
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Blender does not add the script directory to the module path.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import measure_core
+import measure_io
+
+
+FIELDS = ["path", "object", "verts", "faces",
+    "local_area", "local_volume", "global_area", "global_volume",
+    "bbox_min", "bbox_max", "error", "records"]
+
+# Prefix of the result lines printed by Blender (see dumpBlend).
+RESULT_PREFIX = "MEASURE "
+
+
+# Measure one mesh in local and global space.
+def measureRecord(path, name, coords, loops, sizes, matrix, scale=1.0):
+    localArea, localVolume = measure_core.areaAndVolume(coords, loops, sizes)
+    if matrix is None:
+        globalArea, globalVolume = localArea, localVolume
+    else:
+        globalArea, globalVolume = measure_core.areaAndVolume(
+            coords, loops, sizes, matrix)
+    return {
+        "path": path,
+        "object": name,
+        "verts": len(measure_core.asCoords(coords)),
+        "faces": len(sizes),
+        "local_area": localArea * scale ** 2,
+        "local_volume": localVolume * scale ** 3,
+        "global_area": globalArea * scale ** 2,
+        "global_volume": globalVolume * scale ** 3}
+
+
+# Measure all mesh objects of the open .blend file and print them
+# to stdout. Runs inside Blender.
+def dumpBlend():
+    import bpy
+
+    scene = bpy.context.scene
+    scale = scene.unit_settings.scale_length
+    for obj in scene.objects:
+        if obj.type != 'MESH' or not obj.data:
+            continue
+        coords, loops, sizes = measure_core.meshBuffers(obj.data)
+        record = measureRecord(bpy.data.filepath, obj.name, coords, loops,
+            sizes, measure_core.objectMatrix(obj), scale)
+        print(RESULT_PREFIX + json.dumps(record))
+        sys.stdout.flush()
+
+
+# Measure a .blend file with a background Blender process.
+def measureBlend(path, blender):
+    if not blender:
+        raise ValueError("Use --blender to measure .blend files")
+    output = subprocess.run(
+        [blender, "-b", path, "--python", os.path.abspath(__file__),
+            "--", "--dump-blend"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True, check=True).stdout
+    records = []
+    for line in output.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            record = json.loads(line[len(RESULT_PREFIX):])
+            record["path"] = path
+            records.append(record)
+    return records
+
+
+# Measure a memory-mapped mesh file chunk by chunk.
+def measureStream(path):
+    coords, faces = measure_io.mapMesh(path)
+    area, volume, bboxMin, bboxMax = measure_core.streamMeasure(coords, faces)
+    if faces is None:
+        verts, count = 3 * len(coords), len(coords)
+    else:
+        verts, count = len(coords), len(faces)
+    return [{
+        "path": path,
+        "object": os.path.basename(path),
+        "verts": verts,
+        "faces": count,
+        "local_area": area,
+        "local_volume": volume,
+        "global_area": area,
+        "global_volume": volume,
+        "bbox_min": bboxMin.tolist(),
+        "bbox_max": bboxMax.tolist()}]
+
+
+# Measure all meshes in one file. Errors are returned as a record
+# with an "error" field, so they end up in the output too.
+# Every record holds the number of records of the file ("records"),
+# see scanOutput.
+def measureFile(path, blender=None, stream=False):
+    records = measureMeshes(path, blender, stream)
+    for record in records:
+        record["records"] = len(records)
+    return records
+
+
+def measureMeshes(path, blender=None, stream=False):
+    try:
+        if path.lower().endswith(".blend"):
+            return measureBlend(path, blender)
+        if stream and path.lower().endswith(measure_io.STREAM_EXTENSIONS):
+            try:
+                return measureStream(path)
+            except ValueError:
+                # ASCII PLY files and faces of different sizes can not
+                # be mapped, such files are read into memory instead.
+                if not path.lower().endswith(measure_io.MESH_EXTENSIONS):
+                    raise
+        return [measureRecord(path, mesh.name, mesh.coords, mesh.loops,
+                mesh.sizes, mesh.matrix)
+            for mesh in measure_io.readMeshes(path)]
+    except Exception as e:
+        return [{"path": path, "error": "%s: %s" % (type(e).__name__, e)}]
+
+
+# Find all supported files in the given files/directories.
+def findFiles(paths, stream=False):
+    extensions = measure_io.MESH_EXTENSIONS + (".blend",)
+    if stream:
+        # Only one of the two .npy files of a mesh (see mapNpy).
+        extensions += (".faces.npy",)
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(extensions):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+# Read the output file of an earlier run. Returns the paths of the
+# files whose records are all in it, and the length (bytes) of the
+# output up to the last of them.
+# The records of a file are written together (see ResultWriter), so
+# after an interruption only the last file can be incomplete, or its
+# last line cut off. Output without "records" counts one record per
+# file.
+def scanOutput(output, fmt):
+    done = set()
+    end = 0
+    if not os.path.exists(output):
+        return done, end
+    header = None
+    path = None
+    count = 0
+    offset = 0
+    with open(output, "rb") as f:
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                break
+            text = line.decode("utf-8")
+            if fmt == "csv":
+                row = next(csv.reader([text]), [])
+                if header is None:
+                    header = row
+                    end = offset
+                    continue
+                record = dict(zip(header, row))
+            else:
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    break
+            if record.get("path") != path:
+                path = record.get("path")
+                count = 0
+            count += 1
+            if count >= int(record.get("records") or 1):
+                done.add(path)
+                end = offset
+    return done, end
+
+
+# Writes records to a JSONL or CSV file, one file at a time.
+# *) keep: number of bytes of an existing output to keep (see
+#    scanOutput), the rest is dropped. 0 starts a new file.
+class ResultWriter(object):
+    def __init__(self, output, fmt, keep=0):
+        if keep:
+            os.truncate(output, keep)
+            self.file = open(output, "a", newline="")
+        else:
+            self.file = open(output, "w", newline="")
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.file, FIELDS)
+            if not keep:
+                self.csv.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.fmt == "csv":
+                self.csv.writerow(record)
+            else:
+                self.file.write(json.dumps(record) + "\n")
+        # Everything written so far survives an interruption.
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def main(argv):
+    if "--" in argv:
+        # Started by Blender (see measureBlend).
+        if "--dump-blend" in argv[argv.index("--"):]:
+            dumpBlend()
+        return 0
+
+    parser = argparse.ArgumentParser(
+        description="Measure surface area and volume of mesh files.")
+    parser.add_argument("paths", nargs="+",
+        help="Files or directories to measure.")
+    parser.add_argument("-o", "--output", required=True,
+        help="Output file (.jsonl or .csv).")
+    parser.add_argument("--format", choices=("jsonl", "csv"),
+        help="Output format (default: from the output file name).")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+        help="Number of worker processes.")
+    parser.add_argument("--blender",
+        help="Blender executable, needed for .blend files.")
+    parser.add_argument("--stream", action="store_true",
+        help="Memory-map .ply/.stl/.npy files instead of loading them.")
+    parser.add_argument("--no-resume", action="store_true",
+        help="Measure all files again and overwrite the output.")
+    args = parser.parse_args(argv[1:])
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+
+    done, keep = set(), 0
+    if not args.no_resume:
+        done, keep = scanOutput(args.output, fmt)
+    files = [p for p in findFiles(args.paths, args.stream) if p not in done]
+
+    writer = ResultWriter(args.output, fmt, keep)
+    try:
+        if args.workers <= 1:
+            for path in files:
+                writer.write(measureFile(path, args.blender, args.stream))
+        else:
+            with ProcessPoolExecutor(args.workers) as pool:
+                jobs = [pool.submit(measureFile, path, args.blender,
+                    args.stream)
+                    for path in files]
+                for job in as_completed(jobs):
+                    writer.write(job.result())
+    finally:
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,748 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure core
+
+Geometry kernels used by the measure panel. This module does not
+depend on bpy, so it can be used (and tested) outside of Blender.
+
+Meshes are passed around as flat arrays:
+* coords - vertex coordinates, shape (V, 3) or a flat (V*3) array.
+* loops  - vertex indices of all faces, one face after the other.
+* sizes  - number of vertices of each face (3 = triangle, 4 = quad,
+           more for n-gons).
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy
+
+
+# Convert Blender face data (4 vertex indices per face, the 4th
+# index being 0 for triangles) into flat "loops" and "sizes" arrays.
+def facesFromRaw(verts_raw):
+    raw = numpy.asarray(verts_raw, dtype=numpy.int64).reshape(-1, 4)
+    isQuad = raw[:, 3] != 0
+    keep = numpy.ones(raw.shape, dtype=bool)
+    keep[:, 3] = isQuad
+    sizes = numpy.where(isQuad, 4, 3)
+    return raw[keep], sizes
+
+
+# Return the coordinates as a (V, 3) array. Float arrays are not
+# copied (Blender exports float32), the kernels convert every chunk
+# to float64 on its own.
+def asCoords(coords):
+    coords = numpy.asarray(coords)
+    if coords.dtype.kind != "f":
+        coords = coords.astype(numpy.float64)
+    return coords.reshape(-1, 3)
+
+
+# Return the start offset of each face inside the loops array.
+def faceStarts(sizes):
+    sizes = numpy.asarray(sizes, dtype=numpy.int64)
+    return numpy.cumsum(sizes) - sizes
+
+
+# Maximum number of faces processed at once. Keeps the temporary
+# arrays small, independent of the size of the mesh.
+CHUNK_SIZE = 1 << 16
+
+
+# Yield the fan triangulation of all faces, chunk by chunk.
+# Face (v0, v1, ..., vn) is split into (v0, v1, v2), (v0, v2, v3), ...
+# Every chunk is a tuple (face, i0, i1, i2) where "face" is the face
+# index of each triangle and i0, i1, i2 are its vertex indices.
+# Only index arrays of one chunk are built, the mesh itself is never
+# copied or converted (the face starts are calculated per chunk too).
+def fanTriangles(loops, sizes, chunkSize=CHUNK_SIZE):
+    loops = numpy.asarray(loops)
+    sizes = numpy.asarray(sizes)
+    offset = 0
+
+    for begin in range(0, len(sizes), chunkSize):
+        end = min(begin + chunkSize, len(sizes))
+        chunk = sizes[begin:end].astype(numpy.int64)
+        starts = offset + faceStarts(chunk)
+        offset += int(chunk.sum())
+        count = chunk - 2
+        face = numpy.repeat(numpy.arange(begin, end), count)
+        first = numpy.repeat(starts, count)
+        # Position of each triangle inside its face (1 .. n-2).
+        k = numpy.arange(len(face)) - numpy.repeat(
+            numpy.cumsum(count) - count, count) + 1
+        yield face, loops[first], loops[first + k], loops[first + k + 1]
+
+
+# Sums over triangles, added chunk by chunk. Every kernel of this
+# module accumulates through it (see addMesh, or add for triangles
+# from elsewhere):
+# *) area: surface area.
+# *) volume: signed volume (divergence theorem, sum of signed
+#    tetrahedra with the origin).
+# *) areaError, volumeError: estimated bounds of the rounding error.
+# *) moment, covariance: first and second moment of the solid, times
+#    24 and 120 (see massProperties). Only with moments=True.
+# *) faceAreas (optional): array with one entry per face, twice the
+#    area of every face is added to it.
+# *) matrix (optional) is the object to world transformation. The
+#    area is transformed with the cofactor matrix, the volume with
+#    det(matrix). The moments stay in local space.
+# Every chunk is summed pairwise (numpy.sum), the chunk sums are
+# added with math.fsum (exact).
+class TriangleSums(object):
+    def __init__(self, matrix=None, area=True, volume=True, moments=False,
+            faceAreas=None):
+        self.cof = None
+        self.det = 1.0
+        if matrix is not None:
+            linear = linearPart(matrix)
+            self.cof = cofactor(linear)
+            self.det = float(numpy.linalg.det(linear))
+        self.needArea = area or faceAreas is not None
+        self.needVolume = volume or moments
+        self.moments = moments
+        self.faceAreas = faceAreas
+        self.areas = []
+        self.volumes = []
+        self.volumeAbs = 0.0
+        self.largest = 1
+        self.moment = numpy.zeros(3)
+        self.covariance = numpy.zeros((3, 3))
+
+    # Add the triangles (v0, v1, v2), float64 arrays of shape (N, 3).
+    # "face" (face index per triangle) is needed for faceAreas.
+    def add(self, v0, v1, v2, face=None):
+        self.largest = max(self.largest, len(v0))
+        if self.needArea:
+            normals = numpy.cross(v1 - v0, v2 - v0)
+            if self.cof is not None:
+                normals = numpy.dot(normals, self.cof.T)
+            lengths = numpy.linalg.norm(normals, axis=1)
+            self.areas.append(lengths.sum())
+            if self.faceAreas is not None and len(face):
+                # Only the faces of this chunk, not one entry per face
+                # of the mesh.
+                first = face[0]
+                part = numpy.bincount(face - first, lengths)
+                self.faceAreas[first:first + len(part)] += part
+        if self.needVolume:
+            det = numpy.einsum("ij,ij->i", v0, numpy.cross(v1, v2))
+            self.volumes.append(det.sum())
+            self.volumeAbs += numpy.abs(det).sum()
+            if self.moments:
+                s = v0 + v1 + v2
+                self.moment += numpy.dot(det, s)
+                for v in (v0, v1, v2, s):
+                    self.covariance += numpy.dot((v * det[:, None]).T, v)
+
+    # Add the fan triangles of a mesh and return self.
+    # *) mask (optional) is a boolean array with one entry per face.
+    #    Only faces where mask is True are added.
+    # *) origin (optional) is subtracted from the coordinates (see
+    #    preciseAreaAndVolume).
+    def addMesh(self, coords, loops, sizes, mask=None, origin=None):
+        coords = asCoords(coords)
+        if mask is not None:
+            mask = numpy.asarray(mask, dtype=bool)
+        for face, i0, i1, i2 in fanTriangles(loops, sizes):
+            if mask is not None:
+                keep = mask[face]
+                face, i0, i1, i2 = face[keep], i0[keep], i1[keep], i2[keep]
+            v0, v1, v2 = (numpy.asarray(coords[i], dtype=numpy.float64)
+                for i in (i0, i1, i2))
+            if origin is not None:
+                v0, v1, v2 = v0 - origin, v1 - origin, v2 - origin
+            self.add(v0, v1, v2, face)
+        return self
+
+    @property
+    def area(self):
+        return float(math.fsum(self.areas) * 0.5)
+
+    @property
+    def volume(self):
+        return float(math.fsum(self.volumes) / 6.0 * self.det)
+
+    # Pairwise summation error grows with log2(n), a few more
+    # roundings come from the products of each term.
+    def steps(self):
+        return math.log(self.largest, 2) + 8
+
+    @property
+    def areaError(self):
+        return float(EPSILON * self.steps() * self.area)
+
+    @property
+    def volumeError(self):
+        return float(EPSILON * self.steps() * self.volumeAbs / 6.0
+            * abs(self.det))
+
+
+# Calculate the area of every face.
+# Faces are split into fan triangles, so quads give the same
+# result as Blender's face.area.
+# *) matrix (optional) is the object to world transformation.
+# *) out (optional) is a float64 array with one entry per face, the
+#    areas are written into it and it is returned.
+def faceAreas(coords, loops, sizes, matrix=None, out=None):
+    if out is None:
+        areas = numpy.zeros(len(sizes), dtype=numpy.float64)
+    else:
+        areas = out
+        areas[...] = 0.0
+    TriangleSums(matrix, area=False, volume=False,
+        faceAreas=areas).addMesh(coords, loops, sizes)
+    areas *= 0.5
+    return areas
+
+
+# Return the 3x3 linear part of a transformation matrix.
+# The matrix uses the column vector convention (world = matrix * co).
+def linearPart(matrix):
+    return numpy.asarray(matrix, dtype=numpy.float64)[:3, :3]
+
+
+# Return the cofactor matrix of a 3x3 matrix.
+# Cross products transform with it: (L*a) x (L*b) = cofactor(L) * (a x b)
+# This also works for singular (flattened) matrices.
+def cofactor(linear):
+    c0, c1, c2 = linear.T
+    return numpy.array([
+        numpy.cross(c1, c2),
+        numpy.cross(c2, c0),
+        numpy.cross(c0, c1)]).T
+
+
+# Calculate the summed area of all faces.
+# *) mask (optional) is a boolean array with one entry per face.
+#    Only faces where mask is True are counted.
+# *) matrix (optional) is the object to world transformation.
+#    The transformed area is calculated from the local coordinates,
+#    no transformed copy of the mesh is made.
+def surfaceArea(coords, loops, sizes, mask=None, matrix=None):
+    return TriangleSums(matrix, volume=False).addMesh(
+        coords, loops, sizes, mask).area
+
+
+# Calculate the signed volume enclosed by the faces
+# (divergence theorem, sum of signed tetrahedra with the origin).
+# Quads and n-gons are fan-triangulated on the fly.
+# *) matrix (optional) is the object to world transformation.
+#    The world volume is the local volume times det(matrix).
+def signedVolume(coords, loops, sizes, matrix=None):
+    return TriangleSums(matrix, area=False).addMesh(
+        coords, loops, sizes).volume
+
+
+# Calculate surface area and signed volume in a single pass.
+# See surfaceArea and signedVolume for the arguments.
+def areaAndVolume(coords, loops, sizes, matrix=None):
+    sums = TriangleSums(matrix).addMesh(coords, loops, sizes)
+    return sums.area, sums.volume
+
+
+# Machine epsilon of the float64 accumulators.
+EPSILON = numpy.finfo(numpy.float64).eps
+
+
+# Return the centre of the bounding box of the coordinates.
+def boundsCentre(coords):
+    coords = asCoords(coords)
+    if len(coords) == 0:
+        return numpy.zeros(3)
+    return (coords.min(axis=0).astype(numpy.float64)
+        + coords.max(axis=0)) * 0.5
+
+
+# Precise variant of areaAndVolume, for meshes far away from the
+# origin (georeferenced scans) or with a huge number of faces.
+# The coordinates are re-centred on "origin" (default: centre of
+# the bounding box) before the triple products are calculated.
+# This does not change the volume of closed meshes.
+# Returns (area, volume, areaError, volumeError), the errors are
+# estimated bounds of the rounding error of the summation.
+def preciseAreaAndVolume(coords, loops, sizes, matrix=None, origin=None):
+    if origin is None:
+        origin = boundsCentre(coords)
+    sums = TriangleSums(matrix).addMesh(coords, loops, sizes, origin=origin)
+    return sums.area, sums.volume, sums.areaError, sums.volumeError
+
+
+# Return True if the matrix only rotates, translates and scales
+# uniformly (no shear or non-uniform scale). The check is relative to
+# the scale, so it works for tiny (mm) objects as well. A matrix that
+# collapses the first axis is no similarity.
+def isSimilarity(matrix):
+    linear = linearPart(matrix)
+    gram = numpy.dot(linear.T, linear)
+    if gram[0, 0] == 0.0:
+        return False
+    return numpy.allclose(gram / gram[0, 0], numpy.eye(3), atol=0.0)
+
+
+# Local measurements of one mesh, shared by all objects using it
+# (linked duplicates). The mesh is only measured once, the values
+# of each object are derived from its matrix:
+# *) volume: local volume times det(matrix).
+# *) area: scale^2 times local area for uniform scaling. Other
+#    matrices (shear, non-uniform scale) need the mesh again, pass
+#    its (coords, loops, sizes) as "buffers". Only the sums are
+#    kept, nothing per triangle.
+# Set precise=True to re-centre the mesh before the volume is
+# calculated (see preciseAreaAndVolume). volumeError is the estimated
+# bound of the rounding error of the volume.
+class SharedMesh(object):
+    def __init__(self, coords, loops, sizes, precise=False):
+        origin = None
+        if precise:
+            origin = boundsCentre(coords)
+        sums = TriangleSums().addMesh(coords, loops, sizes, origin=origin)
+        self.localArea = sums.area
+        self.localVolume = sums.volume
+        self.localVolumeError = sums.volumeError
+
+    def area(self, matrix=None, buffers=None):
+        if matrix is None:
+            return self.localArea
+        linear = linearPart(matrix)
+        if isSimilarity(linear):
+            # Uniform scale s: det = s^3, area scales with s^2.
+            return self.localArea * abs(numpy.linalg.det(linear)) ** (2.0 / 3.0)
+        if buffers is None:
+            raise ValueError("the mesh buffers are needed for a matrix"
+                " that is no similarity")
+        return surfaceArea(*buffers, matrix=matrix)
+
+    def volume(self, matrix=None):
+        if matrix is None:
+            return self.localVolume
+        return self.localVolume * float(numpy.linalg.det(linearPart(matrix)))
+
+    def volumeError(self, matrix=None):
+        if matrix is None:
+            return self.localVolumeError
+        return self.localVolumeError * abs(
+            float(numpy.linalg.det(linearPart(matrix))))
+
+
+# Mass properties of a solid mesh (see massProperties).
+# *) mass, volume, centre (centre of mass).
+# *) inertia: inertia tensor about the centre of mass.
+# *) bboxMin, bboxMax: axis aligned bounding box.
+# *) obbCentre, obbAxes (rows), obbExtents (half sizes): oriented
+#    bounding box along the principal axes.
+class MassProperties(object):
+    def __init__(self, mass, volume, centre, inertia, bboxMin, bboxMax,
+            obbCentre=None, obbAxes=None, obbExtents=None):
+        self.mass = mass
+        self.volume = volume
+        self.centre = centre
+        self.inertia = inertia
+        self.bboxMin = bboxMin
+        self.bboxMax = bboxMax
+        self.obbCentre = obbCentre
+        self.obbAxes = obbAxes
+        self.obbExtents = obbExtents
+
+    # Principal moments of inertia (ascending) and their axes (rows).
+    def principal(self):
+        moments, axes = numpy.linalg.eigh(self.inertia)
+        return moments, axes.T
+
+
+# Return the inertia tensor of a second moment (covariance) matrix:
+# I = trace(C) * identity - C.
+def inertiaTensor(covariance):
+    return numpy.trace(covariance) * numpy.eye(3) - covariance
+
+
+# Calculate the mass properties of a closed mesh in one pass over
+# the fan triangles. Every triangle (a, b, c) forms a tetrahedron
+# with the origin:
+#   det = a . (b x c)  (6 times the signed volume)
+#   volume += det / 6
+#   first moment += det * (a + b + c) / 24
+#   covariance += det * (aa' + bb' + cc' + ss') / 120, s = a + b + c
+# The coordinates are re-centred on the bounding box first, like in
+# preciseAreaAndVolume.
+# *) matrix (optional) is the object to world transformation. The
+#    local moments are transformed, the mesh is not copied, only the
+#    bounding boxes need the world coordinates (chunk by chunk).
+#    Mirrored objects (negative scale) keep a positive mass.
+# *) density: mass per volume.
+# Returns a MassProperties object.
+def massProperties(coords, loops, sizes, matrix=None, density=1.0):
+    coords = asCoords(coords)
+    origin = boundsCentre(coords)
+    sums = TriangleSums(area=False, moments=True).addMesh(
+        coords, loops, sizes, origin=origin)
+    volume = sums.volume
+    moment = sums.moment / 24.0
+    covariance = sums.covariance / 120.0
+
+    # Centre of mass and covariance about it (local space).
+    if volume != 0.0:
+        centre = moment / volume
+    else:
+        centre = numpy.zeros(3)
+    covariance -= volume * numpy.outer(centre, centre)
+    centre = centre + origin
+
+    if matrix is not None:
+        # A mirror (negative determinant) only flips the winding, not
+        # the solid.
+        linear = linearPart(matrix)
+        det = abs(float(numpy.linalg.det(linear)))
+        volume *= det
+        covariance = det * numpy.dot(numpy.dot(linear, covariance), linear.T)
+        centre = numpy.dot(linear, centre) + numpy.asarray(
+            matrix, dtype=numpy.float64)[:3, 3]
+
+    # Candidate axes of the oriented box: the principal axes of the
+    # solid (or of the vertices if there is no volume, open or flat
+    # meshes) and the object axes. Principal axes are arbitrary for
+    # symmetric shapes (cubes), the smaller box wins.
+    if volume != 0.0:
+        principal = numpy.linalg.eigh(covariance)[1].T
+    else:
+        principal = numpy.linalg.eigh(vertexCovariance(coords, origin))[1].T
+        if matrix is not None:
+            principal = numpy.linalg.qr(numpy.dot(linear, principal.T))[0].T
+    objectAxes = numpy.eye(3)
+    if matrix is not None:
+        objectAxes = numpy.linalg.qr(linear)[0].T
+    axes = numpy.vstack([principal, objectAxes])
+
+    bboxMin, bboxMax, low, high = boundingBoxes(coords, matrix, axes)
+    sizes = numpy.maximum(high - low, 0.0)
+    if numpy.prod(sizes[3:]) <= numpy.prod(sizes[:3]):
+        axes, low, high = axes[3:], low[3:], high[3:]
+    else:
+        axes, low, high = axes[:3], low[:3], high[:3]
+    obbCentre = numpy.dot((low + high) * 0.5, axes)
+    return MassProperties(density * volume, volume, centre,
+        density * inertiaTensor(covariance), bboxMin, bboxMax,
+        obbCentre, axes, (high - low) * 0.5)
+
+
+# Return the covariance matrix of the vertices (identity for less
+# than two vertices). The coordinates are re-centred on "origin" and
+# converted to float64 chunk by chunk.
+def vertexCovariance(coords, origin, chunkSize=CHUNK_SIZE):
+    if len(coords) < 2:
+        return numpy.eye(3)
+    total = numpy.zeros(3)
+    products = numpy.zeros((3, 3))
+    for begin in range(0, len(coords), chunkSize):
+        chunk = coords[begin:begin + chunkSize] - origin
+        total += chunk.sum(axis=0)
+        products += numpy.dot(chunk.T, chunk)
+    mean = total / len(coords)
+    return (products - len(coords) * numpy.outer(mean, mean)) / (
+        len(coords) - 1)
+
+
+# Return the axis aligned box (bboxMin, bboxMax) of the (world)
+# coordinates and their extent (low, high) along the given axes
+# (rows, any number).
+def boundingBoxes(coords, matrix=None, axes=numpy.eye(3),
+        chunkSize=CHUNK_SIZE):
+    bboxMin = numpy.full(3, numpy.inf)
+    bboxMax = numpy.full(3, -numpy.inf)
+    low = numpy.full(len(axes), numpy.inf)
+    high = numpy.full(len(axes), -numpy.inf)
+    for begin in range(0, len(coords), chunkSize):
+        chunk = coords[begin:begin + chunkSize]
+        if matrix is not None:
+            chunk = numpy.dot(chunk, linearPart(matrix).T) + \
+                numpy.asarray(matrix, dtype=numpy.float64)[:3, 3]
+        bboxMin = numpy.minimum(bboxMin, chunk.min(axis=0))
+        bboxMax = numpy.maximum(bboxMax, chunk.max(axis=0))
+        projected = numpy.dot(chunk, axes.T)
+        low = numpy.minimum(low, projected.min(axis=0))
+        high = numpy.maximum(high, projected.max(axis=0))
+    if len(coords) == 0:
+        bboxMin = bboxMax = numpy.zeros(3)
+        low = high = numpy.zeros(len(axes))
+    return bboxMin, bboxMax, low, high
+
+
+# Combine the mass properties of several objects (world space).
+# The inertia tensors are moved to the common centre of mass
+# (parallel axis theorem), the bounding boxes are merged. There is
+# no oriented bounding box of the combination.
+def combineMass(parts):
+    parts = list(parts)
+    mass = sum(p.mass for p in parts)
+    volume = sum(p.volume for p in parts)
+    if mass != 0.0:
+        centre = sum(p.mass * p.centre for p in parts) / mass
+    else:
+        centre = numpy.zeros(3)
+    inertia = numpy.zeros((3, 3))
+    for p in parts:
+        d = p.centre - centre
+        inertia += p.inertia + p.mass * (
+            numpy.dot(d, d) * numpy.eye(3) - numpy.outer(d, d))
+    bboxMin = numpy.min([p.bboxMin for p in parts], axis=0)
+    bboxMax = numpy.max([p.bboxMax for p in parts], axis=0)
+    return MassProperties(mass, volume, centre, inertia, bboxMin, bboxMax)
+
+
+# Measure the area and volume of many objects sharing meshes.
+# *) meshes maps a key to a (coords, loops, sizes) tuple.
+# *) instances is a list of (key, matrix) tuples.
+# Every mesh is measured once.
+# Returns (areas, volumes) with one value per instance.
+def measureInstances(meshes, instances):
+    shared = {}
+    areas = numpy.empty(len(instances))
+    volumes = numpy.empty(len(instances))
+    for i, (key, matrix) in enumerate(instances):
+        if key not in shared:
+            shared[key] = SharedMesh(*meshes[key])
+        areas[i] = shared[key].area(matrix, meshes[key])
+        volumes[i] = shared[key].volume(matrix)
+    return areas, volumes
+
+
+# Measure a mesh that does not need to fit into memory.
+# Only chunkSize faces (and vertices) are loaded at a time, so
+# coords and faces can be memory-mapped arrays (numpy.memmap or
+# numpy.load(..., mmap_mode="r"), see measure_io.mapMesh).
+# *) coords is a (V, 3) array of vertex coordinates and faces an
+#    (F, n) array of vertex indices (all faces have n vertices), or
+# *) faces is None and coords is an (F, 3, 3) array with the corners
+#    of each triangle (like binary STL files).
+# Returns (area, volume, bboxMin, bboxMax).
+def streamMeasure(coords, faces=None, chunkSize=CHUNK_SIZE):
+    sums = TriangleSums()
+    bboxMin = numpy.full(3, numpy.inf)
+    bboxMax = numpy.full(3, -numpy.inf)
+
+    if faces is None:
+        count = len(coords)
+    else:
+        count = len(faces)
+        for begin in range(0, len(coords), chunkSize):
+            chunk = numpy.asarray(coords[begin:begin + chunkSize],
+                dtype=numpy.float64)
+            bboxMin = numpy.minimum(bboxMin, chunk.min(axis=0))
+            bboxMax = numpy.maximum(bboxMax, chunk.max(axis=0))
+
+    for begin in range(0, count, chunkSize):
+        if faces is None:
+            corners = numpy.asarray(coords[begin:begin + chunkSize],
+                dtype=numpy.float64)
+            bboxMin = numpy.minimum(bboxMin, corners.min(axis=(0, 1)))
+            bboxMax = numpy.maximum(bboxMax, corners.max(axis=(0, 1)))
+            triangles = [(corners[:, 0], corners[:, 1], corners[:, 2])]
+        else:
+            chunk = numpy.asarray(faces[begin:begin + chunkSize],
+                dtype=numpy.int64)
+            # Sorted gather, much kinder to memory-mapped files.
+            used, local = numpy.unique(chunk, return_inverse=True)
+            local = local.reshape(chunk.shape)
+            v = numpy.asarray(coords[used], dtype=numpy.float64)
+            triangles = [(v[local[:, 0]], v[local[:, k]], v[local[:, k + 1]])
+                for k in range(1, chunk.shape[1] - 1)]
+
+        for v0, v1, v2 in triangles:
+            sums.add(v0, v1, v2)
+
+    return sums.area, sums.volume, bboxMin, bboxMax
+
+
+# Measure a list of (coords, loops, sizes, matrix) tuples.
+def measureChunk(meshes):
+    return [areaAndVolume(*mesh) for mesh in meshes]
+
+
+# Measure the area and volume of many meshes.
+# *) meshes is a list of (coords, loops, sizes, matrix) tuples,
+#    matrix may be None (local space).
+# *) The meshes are measured in chunks of chunkSize meshes
+#    on "workers" threads (None = one per CPU).
+# *) Set processes=True to use a process pool instead. This is
+#    only worth it for many small meshes, big meshes spend most of
+#    the time in NumPy (which releases the GIL).
+# Returns (areas, volumes, totalArea, totalVolume).
+def measureBatch(meshes, workers=None, chunkSize=16, processes=False):
+    meshes = list(meshes)
+    chunks = [meshes[i:i + chunkSize]
+        for i in range(0, len(meshes), chunkSize)]
+
+    if workers == 1 or len(chunks) <= 1:
+        results = [measureChunk(chunk) for chunk in chunks]
+    else:
+        if processes:
+            pool = ProcessPoolExecutor(workers)
+        else:
+            pool = ThreadPoolExecutor(workers)
+        try:
+            results = list(pool.map(measureChunk, chunks))
+        finally:
+            pool.shutdown()
+
+    areas = numpy.array([r[0] for chunk in results for r in chunk])
+    volumes = numpy.array([r[1] for chunk in results for r in chunk])
+    return areas, volumes, float(areas.sum()), float(volumes.sum())
+
+
+# Return True if two (coords, loops, sizes) tuples hold the same mesh.
+def sameBuffers(a, b):
+    return all(numpy.array_equal(x, y) for x, y in zip(a, b))
+
+
+# Area of the selected faces, updated incrementally.
+# The area of every face is calculated once. When the selection
+# changes only the faces that were (de)selected are added or
+# subtracted from the total.
+class SelectionArea(object):
+    def __init__(self, coords, loops, sizes, matrix=None):
+        self.coords = coords
+        self.loops = loops
+        self.sizes = sizes
+        self.areas = faceAreas(coords, loops, sizes, matrix)
+        self.mask = numpy.zeros(len(self.areas), dtype=bool)
+        self.total = 0.0
+
+    # Memory used by the arrays (see measure_cache.MeasureCache).
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.coords, self.loops, self.sizes,
+            self.areas, self.mask))
+
+    # Return True if the face areas are valid for this mesh data.
+    def matches(self, coords, loops, sizes):
+        return sameBuffers((self.coords, self.loops, self.sizes),
+            (coords, loops, sizes))
+
+    # Select (state=True) or deselect the faces with the given indices.
+    # This costs O(len(faces)).
+    def select(self, faces, state=True):
+        faces = numpy.asarray(faces, dtype=numpy.int64)
+        faces = faces[self.mask[faces] != state]
+        delta = float(self.areas[faces].sum())
+        self.mask[faces] = state
+        if state:
+            self.total += delta
+        else:
+            self.total -= delta
+        return self.total
+
+    # Set the selection from a boolean mask (one entry per face)
+    # and return the area of the selected faces.
+    def update(self, mask):
+        mask = numpy.asarray(mask, dtype=bool)
+        changed = numpy.flatnonzero(mask != self.mask)
+        if len(changed) > len(self.mask) // 2:
+            # Cheaper (and no rounding drift) to start over.
+            self.mask = mask.copy()
+            self.total = float(self.areas[self.mask].sum())
+            return self.total
+        selected = mask[changed]
+        self.select(changed[selected], True)
+        self.select(changed[~selected], False)
+        return self.total
+
+
+# Return the number of vertices and faces of a mesh.
+def meshSize(mesh):
+    if hasattr(mesh, "polygons"):
+        return len(mesh.vertices), len(mesh.polygons)
+    return len(mesh.verts), len(mesh.faces)
+
+
+# Number of vertices sampled by meshFingerprint.
+FINGERPRINT_SAMPLES = 64
+
+
+# Return a cheap fingerprint of the vertex coordinates of a mesh: a
+# hash of up to "samples" vertices spread evenly over the mesh. Edits
+# of single unsampled vertices are missed, but transformations of
+# the whole mesh (e.g. applied scale) change it.
+def meshFingerprint(mesh, samples=FINGERPRINT_SAMPLES):
+    if hasattr(mesh, "polygons"):
+        verts = mesh.vertices
+    else:
+        verts = mesh.verts
+    step = max(len(verts) // samples, 1)
+    return hash(tuple(tuple(verts[i].co)
+        for i in range(0, len(verts), step)[:samples]))
+
+
+# Export the vertex coordinates and faces of a mesh as flat arrays.
+# This uses the bulk foreach_get access instead of looping
+# over mesh.verts and mesh.faces in Python.
+# Both the old (verts/faces) and the newer (vertices/loops/polygons)
+# mesh layout are supported.
+def meshBuffers(mesh):
+    if hasattr(mesh, "polygons"):
+        coords = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+        mesh.vertices.foreach_get("co", coords)
+        loops = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        mesh.loops.foreach_get("vertex_index", loops)
+        sizes = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        mesh.polygons.foreach_get("loop_total", sizes)
+        return coords, loops, sizes
+
+    coords = numpy.empty(len(mesh.verts) * 3, dtype=numpy.float32)
+    mesh.verts.foreach_get("co", coords)
+    verts_raw = numpy.empty(len(mesh.faces) * 4, dtype=numpy.int32)
+    mesh.faces.foreach_get("verts_raw", verts_raw)
+    loops, sizes = facesFromRaw(verts_raw)
+    return coords, loops, sizes
+
+
+# Return the object to world matrix of an object, in the column
+# vector convention used by this module.
+# Blender 2.5 stores obj.matrix for row vectors (co * matrix),
+# newer versions have obj.matrix_world for column vectors.
+def objectMatrix(obj):
+    if hasattr(obj, "matrix_world"):
+        return numpy.array([tuple(row) for row in obj.matrix_world],
+            dtype=numpy.float64)
+    return numpy.array([tuple(row) for row in obj.matrix],
+        dtype=numpy.float64).T
+
+
+# Return the indices of the selected vertices of a mesh.
+def selectedVertices(mesh):
+    if hasattr(mesh, "polygons"):
+        mask = numpy.empty(len(mesh.vertices), dtype=bool)
+        mesh.vertices.foreach_get("select", mask)
+    else:
+        mask = numpy.empty(len(mesh.verts), dtype=bool)
+        mesh.verts.foreach_get("selected", mask)
+    return numpy.flatnonzero(mask)
+
+
+# Export the face selection state of a mesh as a boolean array.
+def faceSelection(mesh):
+    if hasattr(mesh, "polygons"):
+        mask = numpy.empty(len(mesh.polygons), dtype=bool)
+        mesh.polygons.foreach_get("select", mask)
+    else:
+        mask = numpy.empty(len(mesh.faces), dtype=bool)
+        mesh.faces.foreach_get("selected", mask)
+    return mask
@@ -0,0 +1,368 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure I/O
+
+Readers for exported mesh files, returning the flat arrays used by
+measure_core (coords, loops, sizes). Does not depend on bpy.
+
+Supported formats:
+* .obj - Wavefront OBJ (v/f lines, one mesh per "o" object).
+* .ply - ASCII and binary PLY.
+* .npz - NumPy archive with "coords", "loops", "sizes" and an
+         optional "matrix" (4x4, column vector convention).
+* .stl - binary STL.
+
+Meshes larger than memory can be memory-mapped instead (mapMesh)
+and measured with measure_core.streamMeasure.
+"""
+
+import csv
+import os
+
+import numpy
+import numpy.lib.recfunctions
+
+
+MESH_EXTENSIONS = (".obj", ".ply", ".npz", ".stl")
+
+# Files that can be memory-mapped (see mapMesh).
+STREAM_EXTENSIONS = (".ply", ".stl", ".npy")
+
+# Record of a binary STL triangle.
+STL_RECORD = numpy.dtype([
+    ("normal", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+
+
+# A mesh read from a file.
+# matrix is None if the file does not store an object transformation.
+class MeshDump(object):
+    def __init__(self, name, coords, loops, sizes, matrix=None):
+        self.name = name
+        self.coords = coords
+        self.loops = loops
+        self.sizes = sizes
+        self.matrix = matrix
+
+
+# Read a Wavefront OBJ file.
+# Returns a list of MeshDump objects, one for each "o" object.
+# Face indices are global in OBJ files, so every object gets its
+# own copy of the vertices it uses.
+def readObj(path):
+    coords = []
+    objects = []
+    name = os.path.splitext(os.path.basename(path))[0]
+    loops = []
+    sizes = []
+
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                coords.append([float(x) for x in parts[1:4]])
+            elif parts[0] == "f":
+                face = []
+                for part in parts[1:]:
+                    index = int(part.split("/")[0])
+                    # Negative indices are relative to the last vertex.
+                    if index < 0:
+                        index += len(coords)
+                    else:
+                        index -= 1
+                    face.append(index)
+                loops.extend(face)
+                sizes.append(len(face))
+            elif parts[0] in ("o", "g") and len(parts) > 1:
+                if sizes:
+                    objects.append((name, loops, sizes))
+                    loops = []
+                    sizes = []
+                name = parts[1]
+
+    if sizes or not objects:
+        objects.append((name, loops, sizes))
+
+    coords = numpy.array(coords, dtype=numpy.float64).reshape(-1, 3)
+    meshes = []
+    for name, loops, sizes in objects:
+        loops = numpy.array(loops, dtype=numpy.int64)
+        used, loops = numpy.unique(loops, return_inverse=True)
+        meshes.append(MeshDump(name, coords[used], loops,
+            numpy.array(sizes, dtype=numpy.int64)))
+    return meshes
+
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+
+
+# Parse a PLY header.
+# Returns (format, elements, header size in bytes). Every element is
+# (name, count, properties), every property (name, type, listType)
+# where listType is None for scalar properties.
+def readPlyHeader(f):
+    if f.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    fmt = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("PLY header not terminated")
+        parts = line.decode("ascii").split()
+        if not parts or parts[0] in ("comment", "obj_info"):
+            continue
+        if parts[0] == "end_header":
+            break
+        if parts[0] == "format":
+            fmt = parts[1]
+        elif parts[0] == "element":
+            elements.append((parts[1], int(parts[2]), []))
+        elif parts[0] == "property":
+            if parts[1] == "list":
+                prop = (parts[4], PLY_TYPES[parts[3]], PLY_TYPES[parts[2]])
+            else:
+                prop = (parts[2], PLY_TYPES[parts[1]], None)
+            elements[-1][2].append(prop)
+    return fmt, elements, f.tell()
+
+
+# Read the faces of a binary PLY file as flat loops and sizes.
+# If all faces have the same number of vertices (the usual case) the
+# data is read in one go, otherwise face by face.
+def readPlyFaces(f, count, prop, endian):
+    name, itemType, countType = prop
+    countType = numpy.dtype(endian + countType)
+    itemType = numpy.dtype(endian + itemType)
+    start = f.tell()
+
+    first = numpy.frombuffer(f.read(countType.itemsize), countType)
+    f.seek(start)
+    if count and len(first):
+        size = int(first[0])
+        record = numpy.dtype([("n", countType), ("v", itemType, (size,))])
+        data = numpy.fromfile(f, record, count)
+        if len(data) == count and numpy.all(data["n"] == size):
+            return (data["v"].reshape(-1).astype(numpy.int64),
+                numpy.full(count, size, dtype=numpy.int64))
+        f.seek(start)
+
+    loops = []
+    sizes = numpy.empty(count, dtype=numpy.int64)
+    for i in range(count):
+        n = int(numpy.frombuffer(f.read(countType.itemsize), countType)[0])
+        loops.append(numpy.frombuffer(f.read(n * itemType.itemsize), itemType))
+        sizes[i] = n
+    if loops:
+        loops = numpy.concatenate(loops).astype(numpy.int64)
+    else:
+        loops = numpy.zeros(0, dtype=numpy.int64)
+    return loops, sizes
+
+
+# Read a PLY file (ASCII or binary). Returns a list with one MeshDump.
+def readPly(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    coords = numpy.zeros((0, 3))
+    loops = numpy.zeros(0, dtype=numpy.int64)
+    sizes = numpy.zeros(0, dtype=numpy.int64)
+
+    with open(path, "rb") as f:
+        fmt, elements, offset = readPlyHeader(f)
+
+        if fmt == "ascii":
+            lines = f.read().decode("ascii").splitlines()
+            pos = 0
+            for element, count, props in elements:
+                rows = lines[pos:pos + count]
+                pos += count
+                if element == "vertex":
+                    names = [p[0] for p in props]
+                    table = numpy.array([r.split() for r in rows],
+                        dtype=numpy.float64).reshape(count, -1)
+                    coords = table[:, [names.index(a) for a in "xyz"]]
+                elif element == "face":
+                    faces = [r.split() for r in rows]
+                    sizes = numpy.array([int(r[0]) for r in faces],
+                        dtype=numpy.int64)
+                    loops = numpy.array([int(v) for r in faces
+                        for v in r[1:1 + int(r[0])]], dtype=numpy.int64)
+            return [MeshDump(name, coords, loops, sizes)]
+
+        if fmt == "binary_little_endian":
+            endian = "<"
+        elif fmt == "binary_big_endian":
+            endian = ">"
+        else:
+            raise ValueError("Unknown PLY format: %s" % fmt)
+
+        for element, count, props in elements:
+            if all(p[2] is None for p in props):
+                record = numpy.dtype([(p[0], endian + p[1]) for p in props])
+                data = numpy.fromfile(f, record, count)
+                if element == "vertex":
+                    coords = numpy.column_stack(
+                        [data[a] for a in "xyz"]).astype(numpy.float64)
+            elif element == "face" and len(props) == 1:
+                loops, sizes = readPlyFaces(f, count, props[0], endian)
+            else:
+                # Lists in other elements can't be skipped in bulk,
+                # and they are usually stored after the faces anyway.
+                break
+
+    return [MeshDump(name, coords, loops, sizes)]
+
+
+# Read a .npz mesh dump. Returns a list with one MeshDump.
+def readNpz(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    data = numpy.load(path)
+    matrix = None
+    if "matrix" in data:
+        matrix = data["matrix"]
+    return [MeshDump(name, data["coords"], data["loops"], data["sizes"],
+        matrix)]
+
+
+# Memory-map a binary STL file.
+# Returns an (F, 3, 3) array with the corners of each triangle.
+def mapStl(path):
+    size = os.path.getsize(path)
+    count = int(numpy.fromfile(path, "<u4", 1, offset=80)[0])
+    if size != 84 + count * STL_RECORD.itemsize:
+        raise ValueError("Not a binary STL file: %s" % path)
+    return numpy.memmap(path, STL_RECORD, "r", 84, (count,))["v"]
+
+
+# Read a binary STL file. Returns a list with one MeshDump.
+# Corners are not merged, every triangle has its own 3 vertices.
+def readStl(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    coords = numpy.array(mapStl(path), dtype=numpy.float64).reshape(-1, 3)
+    return [MeshDump(name, coords, numpy.arange(len(coords)),
+        numpy.full(len(coords) // 3, 3))]
+
+
+# Memory-map a binary PLY file.
+# Returns (coords, faces): (V, 3) and (F, n) arrays. Only files where
+# all faces have the same number of vertices can be mapped.
+def mapPly(path):
+    with open(path, "rb") as f:
+        fmt, elements, offset = readPlyHeader(f)
+    if fmt == "binary_little_endian":
+        endian = "<"
+    elif fmt == "binary_big_endian":
+        endian = ">"
+    else:
+        raise ValueError("Only binary PLY files can be mapped: %s" % path)
+
+    coords = None
+    faces = None
+    for element, count, props in elements:
+        if all(p[2] is None for p in props):
+            record = numpy.dtype([(p[0], endian + p[1]) for p in props])
+            if element == "vertex":
+                if not record["x"] == record["y"] == record["z"]:
+                    raise ValueError("Mixed vertex types: %s" % path)
+                data = numpy.memmap(path, record, "r", offset, (count,))
+                # A view into the mapped file, nothing is read yet.
+                coords = numpy.lib.recfunctions.structured_to_unstructured(
+                    data[["x", "y", "z"]], copy=False)
+            offset += record.itemsize * count
+        elif element == "face" and len(props) == 1:
+            name, itemType, countType = props[0]
+            countType = numpy.dtype(endian + countType)
+            first = numpy.fromfile(path, countType, 1, offset=offset)
+            size = int(first[0]) if count else 3
+            record = numpy.dtype([("n", countType),
+                ("v", endian + itemType, (size,))])
+            if offset + record.itemsize * count > os.path.getsize(path):
+                raise ValueError("PLY faces have different sizes, "
+                    "can not be mapped: %s" % path)
+            data = numpy.memmap(path, record, "r", offset, (count,))
+            # Check the face sizes chunk by chunk.
+            for begin in range(0, count, 1 << 20):
+                if numpy.any(data["n"][begin:begin + (1 << 20)] != size):
+                    raise ValueError("PLY faces have different sizes, "
+                        "can not be mapped: %s" % path)
+            faces = data["v"]
+            offset += record.itemsize * count
+        else:
+            break
+
+    if coords is None or faces is None:
+        raise ValueError("No vertices/faces found: %s" % path)
+    return coords, faces
+
+
+# Memory-map a mesh stored as two .npy files: "<name>.coords.npy"
+# (V, 3) and "<name>.faces.npy" (F, n). Either file can be given.
+def mapNpy(path):
+    for suffix in (".coords.npy", ".faces.npy"):
+        if path.endswith(suffix):
+            base = path[:-len(suffix)]
+            break
+    else:
+        raise ValueError("Expected a .coords.npy or .faces.npy file: %s" % path)
+    coords = numpy.load(base + ".coords.npy", mmap_mode="r")
+    faces = numpy.load(base + ".faces.npy", mmap_mode="r")
+    return coords, faces
+
+
+# Memory-map a mesh file (see STREAM_EXTENSIONS).
+# Returns (coords, faces) as expected by measure_core.streamMeasure.
+def mapMesh(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".stl":
+        return mapStl(path), None
+    if ext == ".ply":
+        return mapPly(path)
+    if ext == ".npy":
+        return mapNpy(path)
+    raise ValueError("Can not memory-map: %s" % path)
+
+
+# Read any of the supported mesh files (see MESH_EXTENSIONS).
+def readMeshes(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".obj":
+        return readObj(path)
+    if ext == ".ply":
+        return readPly(path)
+    if ext == ".npz":
+        return readNpz(path)
+    if ext == ".stl":
+        return readStl(path)
+    raise ValueError("Unsupported mesh file: %s" % path)
+
+
+# Write a distance matrix as CSV, with the object names as the
+# first row and column.
+def writeDistanceMatrix(path, names, matrix):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([""] + list(names))
+        for name, row in zip(names, matrix):
+            writer.writerow([name] + [repr(float(d)) for d in row])
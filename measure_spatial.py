@@ -0,0 +1,603 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure spatial index
+
+Nearest vertex / closest surface point queries for the measure
+panel. Does not depend on bpy.
+
+A SpatialIndex is built once per mesh and answers queries without
+scanning all vertices. Nearest vertices use scipy's cKDTree if scipy
+is installed. Everything else walks KD-trees built with NumPy
+(KDTree), whose nodes know their boxes: one of the vertices and one
+of the triangles.
+
+Indexes are usually built in local space, so moving, rotating or
+uniformly scaling an object does not rebuild them: the query points
+are transformed into the local space instead (see surfaceDistance).
+"""
+
+import heapq
+
+import numpy
+
+import measure_core
+
+
+# Distance of a point (tuple) from an axis aligned box.
+# Plain Python, this is called for every visited tree node.
+def boxDistance(point, low, high):
+    total = 0.0
+    for p, l, h in zip(point, low, high):
+        if p < l:
+            total += (l - p) ** 2
+        elif p > h:
+            total += (p - h) ** 2
+    return total ** 0.5
+
+
+# KD-tree over a set of points.
+# Every node covers a range of the points (in tree order) and knows
+# its bounding box. Leaves hold up to leafSize points, which are
+# checked with NumPy.
+# *) lows, highs (optional): a box (N, 3) around every point, e.g. of
+#    the triangle a centre belongs to. The node boxes contain them.
+class KDTree(object):
+    def __init__(self, points, leafSize=128, lows=None, highs=None):
+        self.points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        self.order = numpy.arange(len(self.points))
+        self.ranges = []
+        self.children = []
+        self.boxes = []
+        if lows is None:
+            lows = highs = self.points
+        if len(self.points):
+            self.build(0, len(self.points), leafSize, lows, highs)
+        # Points (and their boxes) in tree order, so every leaf is a
+        # contiguous block.
+        self.sorted = self.points[self.order]
+        if lows is self.points:
+            self.sortedLows = self.sortedHighs = self.sorted
+        else:
+            self.sortedLows = lows[self.order]
+            self.sortedHighs = highs[self.order]
+        # Node boxes as (nodes, 3) arrays.
+        self.lows = numpy.array([box[0] for box in self.boxes]).reshape(-1, 3)
+        self.highs = numpy.array([box[1] for box in self.boxes]).reshape(-1, 3)
+
+    def build(self, start, end, leafSize, lows, highs):
+        node = len(self.ranges)
+        self.ranges.append((start, end))
+        self.children.append(None)
+        self.boxes.append(None)
+        if end - start > leafSize:
+            # Split at the median of the longest axis.
+            part = self.points[self.order[start:end]]
+            axis = numpy.argmax(part.max(axis=0) - part.min(axis=0))
+            mid = (start + end) // 2
+            split = numpy.argpartition(part[:, axis], mid - start)
+            self.order[start:end] = self.order[start:end][split]
+            left = self.build(start, mid, leafSize, lows, highs)
+            right = self.build(mid, end, leafSize, lows, highs)
+            self.children[node] = (left, right)
+            # The box of a node contains the boxes of its children.
+            (lowLeft, highLeft), (lowRight, highRight) = (
+                self.boxes[left], self.boxes[right])
+            self.boxes[node] = (tuple(map(min, lowLeft, lowRight)),
+                tuple(map(max, highLeft, highRight)))
+        else:
+            items = self.order[start:end]
+            self.boxes[node] = (tuple(lows[items].min(axis=0)),
+                tuple(highs[items].max(axis=0)))
+        return node
+
+    # Memory used by the arrays (see measure_cache.MeasureCache).
+    @property
+    def nbytes(self):
+        total = (self.points.nbytes + self.order.nbytes + self.sorted.nbytes
+            + self.lows.nbytes + self.highs.nbytes)
+        if self.sortedLows is not self.sorted:
+            total += self.sortedLows.nbytes + self.sortedHighs.nbytes
+        return total
+
+    # Return (distance, index) of the point closest to "point".
+    def nearest(self, point):
+        if len(self.points) == 0:
+            return numpy.inf, -1
+        point = numpy.asarray(point, dtype=numpy.float64)
+        p = tuple(point)
+        best = numpy.inf
+        bestIndex = -1
+        stack = [(0.0, 0)]
+        while stack:
+            dist, node = stack.pop()
+            if dist >= best:
+                continue
+            children = self.children[node]
+            if children is None:
+                start, end = self.ranges[node]
+                d = numpy.linalg.norm(self.sorted[start:end] - point, axis=1)
+                i = numpy.argmin(d)
+                if d[i] < best:
+                    best = float(d[i])
+                    bestIndex = int(self.order[start + i])
+                continue
+            near = [(boxDistance(p, *self.boxes[c]), c) for c in children]
+            # Visit the closer child first (it is pushed last).
+            near.sort(reverse=True)
+            stack.extend(near)
+        return best, bestIndex
+
+    # Return the indices of all points within "radius" of "point".
+    def within(self, point, radius):
+        point = numpy.asarray(point, dtype=numpy.float64)
+        p = tuple(point)
+        found = []
+        stack = [0] if len(self.points) else []
+        while stack:
+            node = stack.pop()
+            if boxDistance(p, *self.boxes[node]) > radius:
+                continue
+            children = self.children[node]
+            if children is None:
+                start, end = self.ranges[node]
+                d = numpy.linalg.norm(self.sorted[start:end] - point, axis=1)
+                found.append(self.order[start:end][d <= radius])
+            else:
+                stack.extend(children)
+        if found:
+            return numpy.concatenate(found)
+        return numpy.zeros(0, dtype=numpy.int64)
+
+
+# Same interface as KDTree, using scipy's cKDTree (faster).
+class PointTree(object):
+    def __init__(self, points):
+        from scipy.spatial import cKDTree
+
+        self.points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        self.tree = cKDTree(self.points)
+
+    def nearest(self, point):
+        if len(self.points) == 0:
+            return numpy.inf, -1
+        dist, index = self.tree.query(point)
+        return float(dist), int(index)
+
+    def within(self, point, radius):
+        return numpy.array(self.tree.query_ball_point(point, radius),
+            dtype=numpy.int64)
+
+
+# Closest points on triangles (a, b, c) to "point".
+# All arguments except point are (N, 3) arrays.
+def closestOnTriangles(point, a, b, c):
+    ab = b - a
+    ac = c - a
+    normal = numpy.cross(ab, ac)
+    length = (normal * normal).sum(axis=1)
+    # Degenerate triangles (no area) only have edges.
+    flat = length == 0.0
+    length[flat] = 1.0
+    # Projection onto the plane and its barycentric coordinates.
+    ap = point - a
+    t = (ap * normal).sum(axis=1) / length
+    projected = point - normal * t[:, None]
+    u = (numpy.cross(projected - a, ac) * normal).sum(axis=1) / length
+    v = (numpy.cross(ab, projected - a) * normal).sum(axis=1) / length
+    inside = (u >= 0) & (v >= 0) & (u + v <= 1) & ~flat
+
+    # Outside: closest point on one of the edges.
+    best = projected.copy()
+    bestDist = numpy.full(len(a), numpy.inf)
+    for p, q in ((a, b), (b, c), (c, a)):
+        pq = q - p
+        l = (pq * pq).sum(axis=1)
+        l[l == 0.0] = 1.0
+        s = numpy.clip(((point - p) * pq).sum(axis=1) / l, 0.0, 1.0)
+        onEdge = p + pq * s[:, None]
+        dist = numpy.linalg.norm(onEdge - point, axis=1)
+        better = ~inside & (dist < bestDist)
+        best[better] = onEdge[better]
+        bestDist[better] = dist[better]
+    return best
+
+
+# Return the points (N, 3) transformed by a 4x4 matrix (column
+# vectors), or the points themselves if the matrix is None.
+def transformPoints(points, matrix):
+    if matrix is None:
+        return points
+    matrix = numpy.asarray(matrix, dtype=numpy.float64)
+    return numpy.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
+
+
+# Return a world space point in the local space of a 4x4 matrix.
+def localPoint(point, matrix):
+    return transformPoints(numpy.asarray(point, dtype=numpy.float64)[None],
+        numpy.linalg.inv(matrix))[0]
+
+
+# Return the scale factor of a similarity matrix (see
+# measure_core.isSimilarity), 1 for None.
+def similarityScale(matrix):
+    if matrix is None:
+        return 1.0
+    return abs(numpy.linalg.det(measure_core.linearPart(matrix))) ** (1.0 / 3.0)
+
+
+# Return boxes (lows & highs, both (N, 3)) transformed by a 4x4 matrix,
+# as axis aligned boxes around the transformed boxes.
+def transformBoxes(lows, highs, matrix):
+    if matrix is None:
+        return lows, highs
+    linear = numpy.asarray(matrix, dtype=numpy.float64)[:3, :3]
+    centres = transformPoints((lows + highs) * 0.5, matrix)
+    half = numpy.dot((highs - lows) * 0.5, numpy.abs(linear).T)
+    return centres - half, centres + half
+
+
+# Distance between two axis aligned boxes, (low, high) tuples.
+# Plain Python like boxDistance.
+def boxGap(boxA, boxB):
+    total = 0.0
+    for lowA, highA, lowB, highB in zip(boxA[0], boxA[1], boxB[0], boxB[1]):
+        if lowB > highA:
+            total += (lowB - highA) ** 2
+        elif lowA > highB:
+            total += (lowA - highB) ** 2
+    return total ** 0.5
+
+
+# Points per leaf of the trees of a SpatialIndex. Two leaves are
+# compared with NumPy, LEAF_SIZE^2 vertex / triangle pairs at once.
+LEAF_SIZE = 64
+
+
+# Spatial index of a mesh (vertices and fan triangles).
+# *) matrix (optional) transforms the mesh into world space first.
+#    Only needed for matrices that are no similarity, otherwise the
+#    local index can be queried with the matrix (see surfaceDistance).
+# Meshes without faces are indexed as degenerate triangles, one per
+# vertex.
+class SpatialIndex(object):
+    def __init__(self, coords, loops, sizes, matrix=None):
+        coords = numpy.asarray(measure_core.asCoords(coords),
+            dtype=numpy.float64)
+        coords = transformPoints(coords, matrix)
+        self.coords = coords
+        # Vertices with node boxes (for surfaceDistance), and scipy's
+        # faster tree for single queries if available.
+        self.vertexTree = KDTree(coords, LEAF_SIZE)
+        try:
+            self.vertices = PointTree(coords)
+        except ImportError:
+            self.vertices = self.vertexTree
+
+        triangles = [numpy.column_stack((i0, i1, i2))
+            for face, i0, i1, i2 in measure_core.fanTriangles(loops, sizes)]
+        if triangles:
+            self.triangles = numpy.concatenate(triangles)
+        else:
+            self.triangles = numpy.repeat(
+                numpy.arange(len(coords))[:, None], 3, axis=1)
+        # Triangles split by their centres, the node boxes contain the
+        # corners.
+        corners = coords[self.triangles]
+        self.triangleTree = KDTree(corners.mean(axis=1), LEAF_SIZE,
+            corners.min(axis=1), corners.max(axis=1))
+
+        # Memory used (see measure_cache.MeasureCache).
+        self.nbytes = (self.vertexTree.nbytes + self.triangles.nbytes
+            + self.triangleTree.nbytes)
+        if self.vertices is not self.vertexTree:
+            self.nbytes += coords.nbytes
+
+    # Return (distance, index) of the vertex closest to "point".
+    def nearestVertex(self, point):
+        return self.vertices.nearest(point)
+
+    # Return the corners of the triangles of a leaf of the triangle
+    # tree, three (N, 3) arrays.
+    def leafCorners(self, node):
+        start, end = self.triangleTree.ranges[node]
+        corners = self.coords[self.triangles[
+            self.triangleTree.order[start:end]]]
+        return corners[:, 0], corners[:, 1], corners[:, 2]
+
+    # Return (distance, location) of the closest point on the surface.
+    # Works like KDTree.nearest on the triangle tree.
+    def closestSurfacePoint(self, point):
+        tree = self.triangleTree
+        if not tree.ranges:
+            return numpy.inf, None
+        point = numpy.asarray(point, dtype=numpy.float64)
+        p = tuple(point)
+        best = numpy.inf
+        location = None
+        stack = [(0.0, 0)]
+        while stack:
+            dist, node = stack.pop()
+            if dist >= best:
+                continue
+            children = tree.children[node]
+            if children is None:
+                closest = closestOnTriangles(point, *self.leafCorners(node))
+                distances = numpy.linalg.norm(closest - point, axis=1)
+                i = numpy.argmin(distances)
+                if distances[i] < best:
+                    best = float(distances[i])
+                    location = closest[i]
+                continue
+            near = [(boxDistance(p, *tree.boxes[c]), c) for c in children]
+            # Visit the closer child first (it is pushed last).
+            near.sort(reverse=True)
+            stack.extend(near)
+        return best, location
+
+
+# Closest pair of a vertex and a triangle of "target" (a SpatialIndex).
+# *) tree: KDTree of the vertices, coords: the vertices in tree order
+#    and lows & highs: the node boxes, all in the space of the target.
+# Both trees are walked together, the pair of nodes with the smallest
+# box distance first, until no remaining pair can be closer than the
+# closest pair found so far (or than "limit"). A leaf is bounded by
+# its single vertices / triangle boxes instead of its node box, so
+# large triangles (e.g. the walls of a room around the other mesh)
+# still prune well.
+# Returns (distance, vertex index, closest point) or None.
+def closestVertexTriangle(tree, coords, lows, highs, target, limit):
+    triangles = target.triangleTree
+    boxes = list(zip(map(tuple, lows), map(tuple, highs)))
+
+    # Lower bound of the distances between the points of two nodes.
+    def gap(vertexNode, triangleNode):
+        vertexLeaf = tree.children[vertexNode] is None
+        triangleLeaf = triangles.children[triangleNode] is None
+        if not (vertexLeaf or triangleLeaf):
+            return boxGap(boxes[vertexNode], triangles.boxes[triangleNode])
+        if vertexLeaf:
+            start, end = tree.ranges[vertexNode]
+            low = high = coords[start:end, None]
+        else:
+            low = lows[vertexNode:vertexNode + 1, None]
+            high = highs[vertexNode:vertexNode + 1, None]
+        if triangleLeaf:
+            start, end = triangles.ranges[triangleNode]
+            otherLow = triangles.sortedLows[None, start:end]
+            otherHigh = triangles.sortedHighs[None, start:end]
+        else:
+            otherLow = triangles.lows[None, triangleNode:triangleNode + 1]
+            otherHigh = triangles.highs[None, triangleNode:triangleNode + 1]
+        between = numpy.maximum(numpy.maximum(otherLow - high,
+            low - otherHigh), 0.0)
+        return float(numpy.sqrt((between * between).sum(axis=2).min()))
+
+    # Number of points of a node.
+    def count(tree, node):
+        start, end = tree.ranges[node]
+        return end - start
+
+    best = None
+    heap = [(gap(0, 0), 0, 0)]
+    while heap:
+        dist, vertexNode, triangleNode = heapq.heappop(heap)
+        if dist >= limit:
+            break
+        vertexChildren = tree.children[vertexNode]
+        triangleChildren = triangles.children[triangleNode]
+        if vertexChildren is None and triangleChildren is None:
+            start, end = tree.ranges[vertexNode]
+            corners = target.leafCorners(triangleNode)
+            size = len(corners[0])
+            points = numpy.repeat(coords[start:end], size, axis=0)
+            closest = closestOnTriangles(points,
+                *[numpy.tile(c, (end - start, 1)) for c in corners])
+            distances = numpy.linalg.norm(closest - points, axis=1)
+            i = numpy.argmin(distances)
+            if distances[i] < limit:
+                limit = float(distances[i])
+                best = (limit, int(tree.order[start + i // size]),
+                    closest[i])
+            continue
+
+        # Split the node with more points (a leaf can not be split).
+        if triangleChildren is None or (vertexChildren is not None
+                and count(tree, vertexNode)
+                >= count(triangles, triangleNode)):
+            pairs = [(child, triangleNode) for child in vertexChildren]
+        else:
+            pairs = [(vertexNode, child) for child in triangleChildren]
+        for vertexNode, triangleNode in pairs:
+            dist = gap(vertexNode, triangleNode)
+            if dist < limit:
+                heapq.heappush(heap, (dist, vertexNode, triangleNode))
+    return best
+
+
+# Minimum distance between the surfaces of two meshes.
+# The vertices of each mesh are checked against the triangles of the
+# other one (see closestVertexTriangle). Exact for the closest vertex
+# and face, but distances between edges are not considered, so the
+# result can be slightly too large for meshes that come closest edge
+# to edge.
+# *) matrixA, matrixB (optional) place indexes built in local space
+#    in the world. They have to be similarities, the vertices of one
+#    mesh are transformed into the local space of the other one and
+#    the distances are scaled.
+# Returns (distance, pointA, pointB), the points in world space.
+def surfaceDistance(indexA, indexB, matrixA=None, matrixB=None):
+    best = (numpy.inf, None, None)
+    for source, target, sourceMatrix, targetMatrix, swap in (
+            (indexA, indexB, matrixA, matrixB, False),
+            (indexB, indexA, matrixB, matrixA, True)):
+        if len(source.coords) == 0 or len(target.coords) == 0:
+            continue
+        # Matrix from the space of the source index to the target one.
+        toTarget = numpy.eye(4)
+        if sourceMatrix is not None:
+            toTarget = numpy.asarray(sourceMatrix, dtype=numpy.float64)
+        if targetMatrix is not None:
+            toTarget = numpy.dot(numpy.linalg.inv(targetMatrix), toTarget)
+        scale = similarityScale(targetMatrix)
+
+        tree = source.vertexTree
+        lows, highs = transformBoxes(tree.lows, tree.highs, toTarget)
+        found = closestVertexTriangle(tree,
+            transformPoints(tree.sorted, toTarget), lows, highs, target,
+            best[0] / scale)
+        if found is None:
+            continue
+        dist, i, location = found
+        location = transformPoints(location[None], targetMatrix)[0]
+        point = transformPoints(source.coords[i][None], sourceMatrix)[0]
+        if swap:
+            best = (dist * scale, location, point)
+        else:
+            best = (dist * scale, point, location)
+    return best
+
+
+# Return the world space origins of objects as an (N, 3) array.
+def objectLocations(objs):
+    return numpy.array([measure_core.objectMatrix(o)[:3, 3] for o in objs],
+        dtype=numpy.float64).reshape(-1, 3)
+
+
+# Return the world space bounding boxes of objects as two (N, 3)
+# arrays (low and high corners), from obj.bound_box.
+def objectBounds(objs):
+    lows = numpy.empty((len(objs), 3))
+    highs = numpy.empty((len(objs), 3))
+    for i, obj in enumerate(objs):
+        matrix = measure_core.objectMatrix(obj)
+        corners = numpy.array([tuple(c) for c in obj.bound_box],
+            dtype=numpy.float64)
+        corners = numpy.dot(corners, matrix[:3, :3].T) + matrix[:3, 3]
+        lows[i] = corners.min(axis=0)
+        highs[i] = corners.max(axis=0)
+    return lows, highs
+
+
+# Distance matrix of rows "rows" of the points to all points.
+def pointDistances(points, rows=slice(None)):
+    diff = points[rows, None, :] - points[None, :, :]
+    return numpy.sqrt((diff * diff).sum(axis=2))
+
+
+# Distance matrix of rows "rows" of the boxes to all boxes
+# (0 for overlapping boxes).
+def boxDistances(lows, highs, rows=slice(None)):
+    gap = numpy.maximum(lows[None, :, :] - highs[rows, None, :],
+        lows[rows, None, :] - highs[None, :, :])
+    gap = numpy.maximum(gap, 0.0)
+    return numpy.sqrt((gap * gap).sum(axis=2))
+
+
+# Number of rows of a distance matrix calculated at once.
+ROW_CHUNK = 256
+
+
+# Return the full distance matrix between objects.
+# Pass points (N, 3) for origin distances, or lows and highs (both
+# (N, 3)) for bounding box distances.
+# *) out (optional) is a (N, N) float64 array the distances are
+#    written into.
+def distanceMatrix(points=None, lows=None, highs=None, out=None):
+    if points is not None:
+        points = numpy.asarray(points, dtype=numpy.float64)
+        count = len(points)
+    else:
+        lows = numpy.asarray(lows, dtype=numpy.float64)
+        highs = numpy.asarray(highs, dtype=numpy.float64)
+        count = len(lows)
+    if out is None:
+        out = numpy.empty((count, count))
+    for begin in range(0, count, ROW_CHUNK):
+        rows = slice(begin, begin + ROW_CHUNK)
+        if points is not None:
+            out[rows] = pointDistances(points, rows)
+        else:
+            out[rows] = boxDistances(lows, highs, rows)
+    return out
+
+
+# Return the k closest pairs as a list of (distance, i, j) with i < j.
+# Works like distanceMatrix, but only ROW_CHUNK rows of the matrix
+# are in memory at a time. For origin distances of many objects a
+# KD-tree (scipy) is used if available.
+def closestPairs(k, points=None, lows=None, highs=None):
+    if points is not None:
+        points = numpy.asarray(points, dtype=numpy.float64)
+        count = len(points)
+        if count > 4 * ROW_CHUNK:
+            try:
+                return closestPairsTree(points, k)
+            except ImportError:
+                pass
+    else:
+        lows = numpy.asarray(lows, dtype=numpy.float64)
+        highs = numpy.asarray(highs, dtype=numpy.float64)
+        count = len(lows)
+
+    best = numpy.zeros(0)
+    bestI = numpy.zeros(0, dtype=numpy.int64)
+    bestJ = numpy.zeros(0, dtype=numpy.int64)
+    columns = numpy.arange(count)
+    for begin in range(0, count, ROW_CHUNK):
+        rows = slice(begin, begin + ROW_CHUNK)
+        if points is not None:
+            dist = pointDistances(points, rows)
+        else:
+            dist = boxDistances(lows, highs, rows)
+        # Only pairs with i < j.
+        i = numpy.arange(begin, begin + len(dist))
+        upper = columns[None, :] > i[:, None]
+        i, j = numpy.nonzero(upper)
+        dist = dist[i, j]
+        i += begin
+        # Keep the k smallest of this chunk and the previous ones.
+        dist = numpy.concatenate([best, dist])
+        i = numpy.concatenate([bestI, i])
+        j = numpy.concatenate([bestJ, j])
+        if len(dist) > k:
+            keep = numpy.argpartition(dist, k - 1)[:k]
+            dist, i, j = dist[keep], i[keep], j[keep]
+        best, bestI, bestJ = dist, i, j
+
+    order = numpy.argsort(best, kind="stable")
+    return [(float(best[n]), int(bestI[n]), int(bestJ[n])) for n in order]
+
+
+# closestPairs for origin distances, using scipy's cKDTree.
+def closestPairsTree(points, k):
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(points)
+    # The k closest pairs are among the k nearest neighbours of
+    # their points.
+    count = min(k + 1, len(points))
+    dist, index = tree.query(points, count)
+    i = numpy.repeat(numpy.arange(len(points)), count)
+    j = index.reshape(-1)
+    dist = dist.reshape(-1)
+    keep = i < j
+    pairs = sorted(set(zip(dist[keep].tolist(), i[keep].tolist(),
+        j[keep].tolist())))
+    return pairs[:k]
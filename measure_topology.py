@@ -0,0 +1,170 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measure topology
+
+Checks whether the volume of a mesh can be trusted. Does not depend
+on bpy.
+
+The signed volume (see measure_core.signedVolume) is only meaningful
+for closed meshes with consistently wound faces. MeshTopology finds
+the edges that break this:
+* boundary edges     - used by one face only (holes).
+* non-manifold edges - used by more than two faces.
+* flipped edges      - used by two faces in the same direction, one
+                       of the faces points inwards.
+Faces connected by correctly wound edges form a region. A part of
+the mesh made of more than one region has flipped regions.
+
+All of this is done with sorting and array operations, no Python
+loop over the faces.
+"""
+
+import numpy
+
+import measure_core
+
+
+# Return the edges of all faces as (start, end) vertex indices, in
+# face order: (v0, v1), (v1, v2), ..., (vn, v0).
+def faceEdges(loops, sizes):
+    loops = numpy.asarray(loops, dtype=numpy.int64)
+    sizes = numpy.asarray(sizes, dtype=numpy.int64)
+    following = numpy.arange(1, len(loops) + 1)
+    # The last vertex of a face is followed by its first one.
+    ends = numpy.cumsum(sizes) - 1
+    following[ends[sizes > 0]] = measure_core.faceStarts(sizes)[sizes > 0]
+    return loops, loops[following]
+
+
+# Label the connected components of a graph with "count" nodes and
+# the given edges (node index arrays). Returns the smallest node
+# index of the component, for every node.
+# Roots are hooked onto smaller roots and the labels are compressed
+# until nothing changes, a few rounds for typical meshes.
+def components(count, first, second):
+    labels = numpy.arange(count)
+    while True:
+        a = labels[first]
+        b = labels[second]
+        differ = a != b
+        if not differ.any():
+            return labels
+        a, b = a[differ], b[differ]
+        numpy.minimum.at(labels, numpy.maximum(a, b), numpy.minimum(a, b))
+        # Compress: every node points to its root.
+        while True:
+            parents = labels[labels]
+            if (parents == labels).all():
+                break
+            labels = parents
+        first, second = first[differ], second[differ]
+
+
+# Return the number of components and, for every label, whether it
+# belongs to the largest component in its group.
+def largestInGroup(labels, groups):
+    unique, inverse, sizes = numpy.unique(labels, return_inverse=True,
+        return_counts=True)
+    # Group (e.g. connected part) of every component.
+    group = groups[unique]
+    order = numpy.lexsort((-sizes, group))
+    largest = numpy.zeros(len(unique), dtype=bool)
+    first = numpy.ones(len(order), dtype=bool)
+    first[1:] = group[order][1:] != group[order][:-1]
+    largest[order[first]] = True
+    return len(unique), largest[inverse]
+
+
+# Topology of a mesh (see module description).
+# Only the faces are needed (loops & sizes), not the coordinates.
+class MeshTopology(object):
+    def __init__(self, loops, sizes):
+        sizes = numpy.asarray(sizes, dtype=numpy.int64)
+        start, end = faceEdges(loops, sizes)
+        faces = numpy.repeat(numpy.arange(len(sizes)), sizes)
+
+        # Undirected edge key; sorting groups all uses of an edge.
+        count = int(max(start.max(), end.max())) + 1 if len(start) else 0
+        low = numpy.minimum(start, end)
+        high = numpy.maximum(start, end)
+        keys = low * count + high
+        order = numpy.argsort(keys, kind="stable")
+        keys = keys[order]
+        first = numpy.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        groupStarts = numpy.flatnonzero(first)
+        uses = numpy.diff(numpy.append(groupStarts, len(keys)))
+
+        # Edge to face index: the faces of edge i are
+        # edgeFaces[edgeStarts[i]:edgeStarts[i] + edgeUses[i]].
+        self.edges = numpy.column_stack([low[order][first],
+            high[order][first]])
+        self.edgeStarts = groupStarts
+        self.edgeUses = uses
+        self.edgeFaces = faces[order]
+
+        self.faceCount = len(sizes)
+        self.boundaryEdges = int((uses == 1).sum())
+        self.nonManifoldEdges = int((uses > 2).sum())
+
+        # Manifold edges: both faces have to use them in opposite
+        # directions.
+        pairs = groupStarts[uses == 2]
+        forward = (start < end)[order]
+        flipped = forward[pairs] == forward[pairs + 1]
+        self.flippedEdges = int(flipped.sum())
+
+        face1 = self.edgeFaces[pairs]
+        face2 = self.edgeFaces[pairs + 1]
+        # Connected parts (through manifold edges) and regions of
+        # consistent winding inside them.
+        parts = components(self.faceCount, face1, face2)
+        regions = components(self.faceCount,
+            face1[~flipped], face2[~flipped])
+        partCount, inLargest = largestInGroup(regions, parts)
+        self.partCount = len(numpy.unique(parts))
+        self.flippedRegions = partCount - self.partCount
+        # Faces outside the largest region of their part.
+        self.flippedFaces = int((~inLargest).sum())
+
+    # Memory used by the arrays (see measure_cache.MeasureCache).
+    @property
+    def nbytes(self):
+        return (self.edges.nbytes + self.edgeStarts.nbytes
+            + self.edgeUses.nbytes + self.edgeFaces.nbytes)
+
+    # The volume can be trusted: the mesh is closed, manifold and
+    # consistently wound.
+    @property
+    def reliable(self):
+        return (self.boundaryEdges == 0 and self.nonManifoldEdges == 0
+            and self.flippedEdges == 0)
+
+    # Return a short description of the problems (empty if reliable).
+    def problems(self):
+        text = []
+        if self.boundaryEdges:
+            text.append("%d boundary" % self.boundaryEdges)
+        if self.nonManifoldEdges:
+            text.append("%d non-manifold" % self.nonManifoldEdges)
+        if self.flippedEdges:
+            text.append("%d flipped (%d regions)" % (
+                self.flippedEdges, self.flippedRegions))
+        return ", ".join(text)
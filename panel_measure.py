@@ -16,12 +16,59 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
+import importlib
+
 import bpy
 from bpy.props import *
+import measure_cache
+
+
+# A module that is imported when it is first used.
+# Loading the panel does not need the NumPy kernels. They are loaded
+# by the first draw that measures a mesh or, in EditMode, reads the
+# vertex selection (measure_api.selectedVertices). Distances between
+# the cursor and objects without meshes never load them.
+# All measurements go through measure_api.py.
+class LazyModule(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.name), attr)
+
+
+measure_api = LazyModule("measure_api")
+measure_io = LazyModule("measure_io")
 
 # Precicion for display of float values.
 PRECISION = 6
 
+# Number of closest object pairs displayed (3 or more objects selected).
+PAIRS_SHOWN = 5
+
+# Number of recent timings kept per phase (see measureProfile).
+PROFILE_SIZE = 256
+
+# Maximum number of cached evaluated (modifiers applied) meshes.
+EVALUATED_CACHE_SIZE = 8
+
+# Seconds the panel waits for a background measurement before it is
+# redrawn again (see watchJobs).
+REDRAW_INTERVAL = 0.05
+
+# Maximum number of cached area/volume values.
+CACHE_SIZE = 2048
+
+# Maximum number of cached spatial indexes (see measure_spatial).
+SPATIAL_CACHE_SIZE = 8
+
+# Maximum number of cached meshes (see measure_core.SharedMesh).
+SHARED_CACHE_SIZE = 64
+
+# Maximum memory used by each cache of per mesh data (face areas,
+# spatial indexes, evaluated meshes, topologies), in bytes.
+MESH_CACHE_BYTES = 256 << 20
+
 """
 Name: 'Measure panel'
 Blender: 250
@@ -29,7 +76,7 @@ Blender: 250
 __author__ = ["Buerbaum Martin (Pontiac)"]
 __url__ = ["http://gitorious.org/blender-scripts/blender-measure-panel-script",
     "http://blenderartists.org/forum/showthread.php?t=177800"]
-__version__ = '0.6.1'
+__version__ = '0.7'
 __bpydoc__ = """
 Measure panel
 
@@ -38,15 +85,34 @@ This script displays in OBJECT MODE:
   3D space (if NOTHING is selected).
 * The distance of the 3D cursor to the center of an object
   (if exactly ONE object is selected).
-* The distance between 2 object centers
-  (if exactly TWO objects are selected).
-* The surface area of any selected mesh object.
+* The distance between 2 object centers and the minimum distance
+  between their surfaces (if exactly TWO objects are selected).
+* The closest pairs of objects, by centre or bounding box (if THREE
+  or more objects are selected). All distances can be exported to a
+  CSV file.
+* The surface area and volume of any selected mesh object, and the
+  totals. The volume is marked as unreliable if the mesh has holes,
+  non-manifold or flipped edges.
+* Optionally the mass properties (mass, centre of mass, inertia,
+  bounding boxes) with a density per object ("density" custom
+  property).
 
 Display in EDIT MODE (Local and Global space supported):
 * The distance of the 3D cursor to the origin
-  (in Local space it is the object center instead).
+  (in Local space it is the object center instead), and the
+  closest vertex and surface point to the 3D cursor.
 * The distance of the 3D cursor to a selected vertex.
 * The distance between 2 selected vertices.
+* The area of the selected faces.
+
+Options:
+* Precise: sums with less rounding error, the volume is shown with
+  an error bound.
+* Apply Modifiers: measure the final mesh instead of the base mesh.
+* Profile: timings of the panel in the "Measure Profile" panel.
+
+Large meshes are measured in the background, "computing..." is
+displayed until the values are ready. Needs NumPy.
 
 Usage:
 
@@ -57,6 +123,19 @@ It's very helpful to use one or two "Empty" objects with
 "Snap during transform" enabled for fast measurement.
 
 Version history:
+v0.7 - Areas and volumes are calculated with NumPy from bulk exported
+    vertex/face arrays (see measure_core.py), in background jobs,
+    and cached per mesh (shared by linked duplicates).
+    Added volume, precise mode with error bound and topology
+    warnings (unreliable volume).
+    Added mass properties and a density setting.
+    Added closest pairs of objects and CSV export of all distances,
+    the minimum surface distance of 2 objects and the closest
+    vertex/surface to the 3D cursor.
+    Added measuring with modifiers applied.
+    Added the "Measure Profile" panel.
+    New modules for scripts & the command line: measure_api.py,
+    measure_cli.py.
 v0.6.1 - Updated reenter_editmode operator description.
     Fixed search for selected mesh objects.
     Added "BU^2" after values that are not yet translated via "unit".
@@ -117,6 +196,313 @@ def measureLocal(scene):
     return (scene.measure_panel_transform == "measure_local")
 
 
+# User friendly access to the "pairs" setting.
+def measurePairBounds(scene):
+    return (scene.measure_panel_pairs == "pairs_bounds")
+
+
+# Return the data for the distances between objects: the origins, or
+# the bounding boxes (see measure_spatial.closestPairs).
+def pairData(scene, objs):
+    if measurePairBounds(scene):
+        lows, highs = measure_api.objectBounds(objs)
+        return {"lows": lows, "highs": highs}
+    return {"points": measure_api.objectLocations(objs)}
+
+
+# Return the density of an object: its "density" custom property,
+# or the "density" setting of the panel.
+def objectDensity(scene, obj):
+    get = getattr(obj, "get", None)
+    if get is not None:
+        density = get("density")
+        if density is not None:
+            return float(density)
+    return scene.measure_panel_density
+
+
+# User friendly access to the "precise" setting.
+def measurePrecise(scene):
+    return bool(scene.measure_panel_precise)
+
+
+# Switch measureProfile on or off with the "profile" setting. Done on
+# every draw of the main panel, the profile sub-panel is closed by
+# default.
+def syncProfile(scene):
+    measureProfile.enabled = bool(scene.measure_panel_profile)
+
+
+# Cached area/volume values (see measureKey).
+measureCache = measure_cache.MeasureCache(CACHE_SIZE)
+
+# Face areas for the selected face area in EditMode
+# (see VIEW3D_PT_measure.selectedFaceArea).
+selectionAreas = measure_cache.MeasureCache(SHARED_CACHE_SIZE,
+    MESH_CACHE_BYTES)
+
+# Spatial indexes for closest vertex/surface queries.
+spatialIndexes = measure_cache.MeasureCache(SPATIAL_CACHE_SIZE,
+    MESH_CACHE_BYTES)
+
+# Local measurements per mesh, shared by linked duplicates.
+sharedMeshes = measure_cache.MeasureCache(SHARED_CACHE_SIZE,
+    MESH_CACHE_BYTES)
+
+# Buffers of evaluated meshes (see objectBuffers).
+evaluatedMeshes = measure_cache.MeasureCache(EVALUATED_CACHE_SIZE,
+    MESH_CACHE_BYTES)
+
+# Topology checks per mesh version (see measure_topology).
+meshTopologies = measure_cache.MeasureCache(SHARED_CACHE_SIZE,
+    MESH_CACHE_BYTES)
+
+# Background measurements, results end up in measureCache.
+measureScheduler = measure_cache.MeasureScheduler(measureCache)
+
+# Opt-in draw/job timings, see VIEW3D_PT_measure_profile.
+measureProfile = measure_cache.MeasureProfile(PROFILE_SIZE)
+measureScheduler.profile = measureProfile
+
+# Update counter per mesh (by name).
+# obj.data is only updated when EditMode is exited (see
+# OBJECT_OT_reenter_editmode), so that is when the counter is increased.
+meshVersions = {}
+
+# Fingerprints of the meshes (see measure_core.meshFingerprint), by
+# mesh name. Taken once per redraw, see meshKey.
+meshFingerprints = {}
+
+# Settings of the modifier stacks, by object name. Read once per
+# redraw, see modifierStackKey.
+modifierStacks = {}
+
+# Name of the mesh last drawn in EditMode (None in ObjectMode).
+editMeshName = None
+
+# Names of the selected objects when the panel was last drawn.
+lastSelection = ()
+
+
+# Record the run time of a function under "name" in measureProfile
+# (only while profiling is enabled).
+def profiled(name):
+    def decorate(func):
+        def wrapper(*args, **kwargs):
+            start = measureProfile.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                measureProfile.stop(name, start)
+        return wrapper
+    return decorate
+
+
+# Export the mesh arrays (see measure_core.meshBuffers) and count
+# the copied bytes and faces.
+@profiled("copy")
+def meshBuffers(mesh):
+    coords, loops, sizes = measure_api.meshBuffers(mesh)
+    if measureProfile.enabled:
+        measureProfile.count("faces copied", len(sizes))
+        measureProfile.count("bytes copied",
+            coords.nbytes + loops.nbytes + sizes.nbytes)
+    return coords, loops, sizes
+
+
+def touchMesh(mesh):
+    meshVersions[mesh.name] = meshVersions.get(mesh.name, 0) + 1
+
+
+# Keep track of EditMode.
+# When it is left, the edited mesh has changed.
+def updateEditMesh(context):
+    global editMeshName
+
+    obj = context.active_object
+    if (context.mode == 'EDIT_MESH'
+        and obj and obj.type == 'MESH' and obj.data):
+        name = obj.data.name
+    else:
+        name = None
+
+    if editMeshName is not None and editMeshName != name:
+        meshVersions[editMeshName] = meshVersions.get(editMeshName, 0) + 1
+    editMeshName = name
+
+
+# Cancel background measurements that are not needed anymore.
+@profiled("selection")
+def updateSelection(context):
+    global lastSelection
+
+    selection = tuple(o.name for o in (context.selected_objects or ()))
+    if selection != lastSelection:
+        measureScheduler.cancel()
+        lastSelection = selection
+
+
+# Make sure the panel is redrawn when the running background
+# measurements finish, otherwise "computing..." stays until the
+# next redraw. Called at the end of draw(), "collected" is the number
+# of results draw() started with.
+# Every redraw rebuilds the keys of all selected objects (fingerprints,
+# matrices, modifier stacks). While no new result has arrived, wait up
+# to REDRAW_INTERVAL for a job to finish before the next redraw, so
+# the panel is not redrawn in a busy loop and the workers get the GIL.
+# The UI reacts a little slower while jobs are running.
+def watchJobs(context, collected):
+    if not measureScheduler.pendingCount():
+        return
+    if not collected:
+        measureScheduler.wait(REDRAW_INTERVAL)
+    if context.area is not None:
+        # Draw again (and collect the results) until the jobs are
+        # done.
+        context.area.tag_redraw()
+
+
+# Background job: create a measure_core.SelectionArea and
+# remember which mesh version it was made for.
+def selectionAreaJob(version, *args):
+    selection = measure_api.SelectionArea(*args)
+    selection.version = version
+    return selection
+
+
+# Background job: the k closest pairs of objects.
+def closestPairsJob(k, data):
+    return measure_api.closestPairs(k, **data)
+
+
+# Background job: minimum distance between two spatial indexes
+# (placed in the world by their matrices, see spatialIndex).
+def surfaceDistanceJob(index1, index2, matrix1, matrix2):
+    return measure_api.surfaceDistance(index1, index2,
+        matrixA=matrix1, matrixB=matrix2)[0]
+
+
+# Background job: run func(*args) and scale the result.
+def scaledJob(func, factor, *args):
+    return func(*args) * factor
+
+
+# Build the cache key of a mesh: name, update counter, a fingerprint
+# of the coordinates and the vertex & face count. The fingerprint
+# catches changes made outside of EditMode (applied scale, scripts).
+def meshKey(mesh):
+    fingerprint = meshFingerprints.get(mesh.name)
+    if fingerprint is None:
+        fingerprint = measure_api.meshFingerprint(mesh)
+        meshFingerprints[mesh.name] = fingerprint
+    return ("mesh", mesh.name, meshVersions.get(mesh.name, 0),
+        fingerprint) + measure_api.meshSize(mesh)
+
+
+# Measure the mesh with modifiers applied? Only in ObjectMode, in
+# EditMode the edited mesh itself is measured.
+def useEvaluated(scene, obj):
+    return (scene.measure_panel_evaluated and len(obj.modifiers) > 0
+        and obj.data.name != editMeshName)
+
+
+# Return the settings of a modifier as a tuple of
+# (property, value) pairs. Referenced objects (boolean operand, array
+# offset, curve) are represented by their name and world matrix, and
+# the mesh key of mesh objects: moving or editing them changes the
+# result.
+def modifierSettings(modifier):
+    rna = getattr(modifier, "bl_rna", None) or modifier.rna_type
+    settings = []
+    for prop in rna.properties:
+        if prop.identifier == "rna_type":
+            continue
+        value = getattr(modifier, prop.identifier, None)
+        if hasattr(value, "matrix"):
+            other = value
+            value = (other.name, measure_api.objectMatrix(other).tobytes())
+            if other.type == 'MESH':
+                value += meshKey(other.data)
+        elif hasattr(value, "name"):
+            value = value.name
+        elif not isinstance(value, (bool, int, float, str, type(None))):
+            try:
+                value = tuple(value)
+            except TypeError:
+                value = repr(value)
+        settings.append((prop.identifier, value))
+    return tuple(settings)
+
+
+# Return the settings of all modifiers of an object (see
+# modifierSettings), read once per redraw.
+def modifierStackKey(obj):
+    key = modifierStacks.get(obj.name)
+    if key is None:
+        key = tuple(modifierSettings(m) for m in obj.modifiers)
+        modifierStacks[obj.name] = key
+    return key
+
+
+# Build the cache key of the mesh measured for an object: the base
+# mesh (see meshKey) and, with modifiers applied, the object name
+# and the settings of its modifier stack.
+def objectMeshKey(scene, obj):
+    key = meshKey(obj.data)
+    if useEvaluated(scene, obj):
+        key = ("evaluated", obj.name) + key + modifierStackKey(obj)
+    return key
+
+
+# Export the final mesh of an object (modifiers applied) as flat
+# arrays. The temporary mesh is freed again.
+@profiled("evaluate")
+def evaluatedBuffers(scene, obj):
+    mesh = obj.create_mesh(scene, True, 'PREVIEW')
+    try:
+        return meshBuffers(mesh)
+    finally:
+        bpy.data.meshes.remove(mesh)
+
+
+# Return the mesh arrays measured for an object: obj.data, or the
+# evaluated mesh if modifiers are applied. Evaluated meshes are
+# cached until the mesh or the modifier stack changes (see
+# objectMeshKey).
+def objectBuffers(scene, obj):
+    if not useEvaluated(scene, obj):
+        return meshBuffers(obj.data)
+    key = objectMeshKey(scene, obj)
+    buffers = evaluatedMeshes.get(key)
+    if buffers is None:
+        buffers = evaluatedBuffers(scene, obj)
+        evaluatedMeshes.put(key, buffers)
+    return buffers
+
+
+# Build the cache key of a measurement.
+# It contains everything the result depends on: the mesh (see
+# objectMeshKey), the world matrix (global space only), the space, the
+# precise setting and the unit scale. Objects sharing a mesh share the local values.
+def measureKey(scene, obj, kind, globalSpace):
+    key = (kind,) + objectMeshKey(scene, obj) + (
+        scene.unit_settings.scale_length, globalSpace, measurePrecise(scene))
+    if globalSpace:
+        key += (measure_api.objectMatrix(obj).tobytes(),)
+    return key
+
+
+# Build the cache key of a spatial index (see
+# VIEW3D_PT_measure.spatialIndex). matrix is None for indexes in
+# local space.
+def spatialKey(scene, obj, matrix):
+    if matrix is not None:
+        matrix = matrix.tobytes()
+    return ("spatial",) + objectMeshKey(scene, obj) + (matrix,)
+
+
+# obj.data only holds the EditMode changes once EditMode is exited,
+# this operator does that (and re-enters it).
 class OBJECT_OT_reenter_editmode(bpy.types.Operator):
     bl_label = "Re-enter EditMode"
     bl_idname = "reenter_editmode"
@@ -129,6 +515,9 @@ class OBJECT_OT_reenter_editmode(bpy.types.Operator):
         obj = context.active_object
 
         if (obj and obj.type == 'MESH' and context.mode == 'EDIT_MESH'):
+            # The mesh data is updated, cached values are outdated.
+            touchMesh(obj.data)
+
             # Exit and re-enter mesh EditMode.
             bpy.ops.object.mode_set(mode='OBJECT')
             bpy.ops.object.mode_set(mode='EDIT')
@@ -137,6 +526,34 @@ class OBJECT_OT_reenter_editmode(bpy.types.Operator):
         return ('CANCELLED',)
 
 
+class OBJECT_OT_export_distances(bpy.types.Operator):
+    bl_label = "Export Distances"
+    bl_idname = "export_distances"
+    bl_description = "Export the distances between all selected" \
+        " objects to a CSV file."
+
+    path = StringProperty(name="File Path",
+        description="CSV file to write the distance matrix to.",
+        default="measure_distances.csv")
+
+    # Ask for the file name first (execute() runs when it is chosen).
+    def invoke(self, context, event):
+        context.manager.add_fileselect(self)
+        return ('RUNNING_MODAL',)
+
+    def execute(self, context):
+        objs = context.selected_objects
+        if not objs:
+            return ('CANCELLED',)
+
+        scale = context.scene.unit_settings.scale_length
+        matrix = measure_api.distanceMatrix(**pairData(context.scene, objs))
+        matrix *= scale
+        measure_io.writeDistanceMatrix(self.path,
+            [o.name for o in objs], matrix)
+        return ('FINISHED',)
+
+
 class VIEW3D_PT_measure(bpy.types.Panel):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
@@ -144,36 +561,23 @@ class VIEW3D_PT_measure(bpy.types.Panel):
     #bl_default_closed = True
     bl_default_closed = False
 
+    @profiled("draw")
     def draw(self, context):
-        from Mathutils import Vector, Matrix
-
         layout = self.layout
         scene = context.scene
         self.scene = context.scene
 
         # Get the active object.
         obj = context.active_object
-        
-        # Define a temporary attribute for the distance value
-        scene.FloatProperty(
-            name="Distance",
-            attr="measure_panel_dist",
-            precision=PRECISION,
-            unit="LENGTH")
-
-        TRANSFORM = [
-            ("measure_global", "Global",
-                "Calculate values in global space."),
-            ("measure_local", "Local",
-                "Calculate values inside the local object space.")]
-
-        # Define dropdown for the global/local setting
-        bpy.types.Scene.EnumProperty(
-            attr="measure_panel_transform",
-            name="Space",
-            description="Choose in which space you want to measure.",
-            items=TRANSFORM,
-            default='measure_global')
+
+        syncProfile(scene)
+
+        # Fetch results of finished background measurements.
+        meshFingerprints.clear()
+        modifierStacks.clear()
+        updateEditMesh(context)
+        updateSelection(context)
+        collected = measureScheduler.collect()
 
         if (context.mode == 'EDIT_MESH'):
             if (obj and obj.type == 'MESH' and obj.data):
@@ -183,8 +587,8 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                 # selection state of the mesh."
                 # http://www.blender.org/documentation/249PythonDoc/
                 # /Mesh.MVert-class.html#sel
-                # We can only provide this by existing & re-entering EditMode.
-                # @todo: Better way to do this?
+                # We can only provide this by exiting & re-entering
+                # EditMode (see OBJECT_OT_reenter_editmode).
 
                 # Get mesh data from Object.
                 mesh = obj.data
@@ -196,10 +600,14 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                 #Matrix.invert(ob_mat_inv)
 
                 # Get the selected vertices.
-                # @todo: Better (more efficient) way to do this?
-                verts_selected = [v for v in mesh.verts if v.selected == 1]
-
-                if len(verts_selected) == 0:
+                # Only the first two are ever needed.
+                start = measureProfile.start()
+                selected = measure_api.selectedVertices(mesh)
+                measureProfile.stop("selection", start)
+                verts = mesh.verts
+                verts_selected = [verts[int(i)] for i in selected[:2]]
+
+                if len(selected) == 0:
                     # Nothing selected.
                     # We measure the distance from the origin to the 3D cursor.
 
@@ -217,9 +625,14 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                     row.label(text="", icon='ARROW_LEFTRIGHT')
                     row.label(text="Origin [0,0,0]")
 
-                    row = layout.row()
-                    row.operator("reenter_editmode",
-                        text="Update selection & distance")
+                    # Closest vertex & surface point to the 3D cursor.
+                    if measureLocal(scene):
+                        cursor = (scene.cursor_location - obj.location) * ob_mat_inv
+                    else:
+                        cursor = scene.cursor_location
+                    self.addClosestToCursor(obj, tuple(cursor), measureGlobal(scene))
+
+                    self.addUpdateButton("Update selection & distance")
 #                       @todo
 #                        description="The surface area value can" \
 #                            " not be updated in mesh edit mode" \
@@ -232,7 +645,7 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                         "measure_panel_transform",
                         expand=True)
 
-                elif len(verts_selected) == 1:
+                elif len(selected) == 1:
                     # One vertex selected.
                     # We measure the distance from the
                     # selected vertex object to the 3D cursor.
@@ -253,16 +666,14 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                     row.label(text="", icon='ARROW_LEFTRIGHT')
                     row.label(text="", icon='VERTEXSEL')
 
-                    row = layout.row()
-                    row.operator("reenter_editmode",
-                        text="Update selection & distance")
+                    self.addUpdateButton("Update selection & distance")
 
                     row = layout.row()
                     row.prop(scene,
                         "measure_panel_transform",
                         expand=True)
 
-                elif len(verts_selected) == 2:
+                elif len(selected) == 2:
                     # Two vertices selected.
                     # We measure the distance between the
                     # two selected vertices.
@@ -283,9 +694,7 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                     row.label(text="", icon='ARROW_LEFTRIGHT')
                     row.label(text="", icon='VERTEXSEL')
 
-                    row = layout.row()
-                    row.operator("reenter_editmode",
-                        text="Update selection & distance")
+                    self.addUpdateButton("Update selection & distance")
 
                     row = layout.row()
                     row.prop(scene,
@@ -294,17 +703,16 @@ class VIEW3D_PT_measure(bpy.types.Panel):
 
                 else:
                     # Get selected faces
-                    # @todo: Better (more efficient) way to do this?
-                    faces_selected = [f for f in mesh.faces if f.selected == 1]
+                    start = measureProfile.start()
+                    faces_selected = measure_api.faceSelection(mesh)
+                    measureProfile.stop("selection", start)
 
-                    if len(faces_selected) > 0:
-                        area = self.objectSurfaceArea(obj, True, measureGlobal(self.scene))
+                    if faces_selected.any():
+                        area = self.selectedFaceArea(obj, faces_selected, measureGlobal(self.scene))
                         row = self.layout.row()
-                        row.label(text="Selected Face Area: "+str(round(area, PRECISION))+self.units(2), icon='FACESEL')
+                        row.label(text="Selected Face Area: "+self.formatValue(area, 2), icon='FACESEL')
 
-                        row = layout.row()
-                        row.operator("reenter_editmode",
-                            text="Update selection & area")
+                        self.addUpdateButton("Update selection & area")
 
                         row = layout.row()
                         row.prop(scene,
@@ -315,9 +723,7 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                         row = layout.row()
                         row.label(text="Selection not supported.", icon='INFO')
 
-                        row = layout.row()
-                        row.operator("reenter_editmode",
-                            text="Update selection")
+                        self.addUpdateButton("Update selection")
 
         elif (context.mode == 'OBJECT'):
             # We are working on object mode.
@@ -326,6 +732,9 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                 and len(context.selected_objects) > 2):
                 # We have more that 2 objects selected...
 
+                # Display the closest pairs of objects.
+                self.addClosestPairs(context.selected_objects)
+
                 mesh_objects = [o for o in context.selected_objects
                     if (o.type == 'MESH' and o.data)]
 
@@ -363,9 +772,15 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                 #row.prop(obj2, "name", text="", icon='OBJECT_DATA')
 
                 # Calculate and display surface area of the objects.
+                mesh_objects = [o for o in (obj1, obj2)
+                    if (o.type == 'MESH' and o.data)]
                 #self.addObjectAreas(mesh_objects)
                 #self.addObjectVolumes(mesh_objects)
-                self.addAreasAndVolumes(mesh_objects)
+                self.addAreasAndVolumes(*mesh_objects)
+
+                # Minimum distance between the two surfaces.
+                if len(mesh_objects) == 2:
+                    self.addSurfaceDistance(obj1, obj2)
 
                 row = layout.row()
                 row.prop(scene,
@@ -419,89 +834,425 @@ class VIEW3D_PT_measure(bpy.types.Panel):
                 row = layout.row()
                 row.label(text="Selection not supported.", icon='INFO')
 
+        watchJobs(context, collected)
+
 
+    # Display area and volume of the given objects (and the totals).
+    # Values that are still being calculated in the background are
+    # displayed as "computing..." and the totals are marked as partial.
+    @profiled("areas")
     def addAreasAndVolumes(self, *objs):
         area = 0.0
         total_area = 0.0
         volume = 0.0
         total_volume = 0.0
+        partial = False
+        unreliable = False
         globalCoords = measureGlobal(self.scene)
         for o in objs:
             area = self.objectSurfaceArea(o, False, globalCoords)
-            if(area >= 0):
+            if area is None:
+                partial = True
+            elif(area >= 0):
                 total_area += area
             row = self.layout.row()
-            row.label(text=o.name+" S.A.: "+str(round(area, PRECISION))+self.units(2), icon='OBJECT_DATA')
+            row.label(text=o.name+" S.A.: "+self.formatValue(area, 2), icon='OBJECT_DATA')
 
             volume = self.objectVolume(o, globalCoords)
-            if(volume >= 0):
+            if volume is None:
+                partial = True
+            elif(volume >= 0):
                 total_volume += volume
+            text = o.name+" Vol.: "+self.formatValue(volume, 3)
+            if volume not in (None, -1) and measurePrecise(self.scene):
+                # Estimated rounding error of the precise volume.
+                error = self.objectVolumeError(o, globalCoords)
+                if error is not None:
+                    text += " \u00b1 %.1e" % error + self.units(3)
             row = self.layout.row()
-            row.label(text=o.name+" Vol.: "+str(round(volume, PRECISION))+self.units(3), icon='OBJECT_DATA')
+            row.label(text=text, icon='OBJECT_DATA')
+
+            # Open or inconsistently wound meshes have no real volume.
+            topology = self.meshTopology(o)
+            if topology not in (None, -1) and not topology.reliable:
+                unreliable = True
+                row = self.layout.row()
+                row.label(text="Unreliable volume: "+topology.problems()+" edges", icon='ERROR')
 
         if(len(objs) > 1):
+            if partial:
+                prefix = "Partial "
+            else:
+                prefix = ""
             if(total_area >= 0):
                 row = self.layout.row()
-                row.label(text='Total Area: '+str(round(total_area, PRECISION))+self.units(2), icon='OBJECT_DATA')
+                row.label(text=prefix+'Total Area: '+str(round(total_area, PRECISION))+self.units(2), icon='OBJECT_DATA')
             if(total_volume >= 0):
+                if unreliable:
+                    suffix = " (unreliable)"
+                else:
+                    suffix = ""
                 row = self.layout.row()
-                row.label(text='Total Volume: '+str(round(total_volume, PRECISION))+self.units(3), icon='OBJECT_DATA')
+                row.label(text=prefix+'Total Volume: '+str(round(total_volume, PRECISION))+self.units(3)+suffix, icon='OBJECT_DATA')
+
+        row = self.layout.row()
+        row.prop(self.scene, "measure_panel_precise")
+        row.prop(self.scene, "measure_panel_mass")
+        row = self.layout.row()
+        row.prop(self.scene, "measure_panel_evaluated")
+        if self.scene.measure_panel_mass:
+            self.addMassProperties(objs, globalCoords)
         return total_area
 
 
+    # Display mass, centre of mass, principal moments of inertia and
+    # bounding box sizes of mesh objects, and of all of them together
+    # in global space (see measure_core.massProperties). Each object
+    # is measured in the background.
+    @profiled("mass")
+    def addMassProperties(self, objs, globalSpace):
+        scale = self.scene.unit_settings.scale_length
+        parts = []
+        partial = False
+        for o in objs:
+            if not (o.type == 'MESH' and o.data):
+                continue
+            props = self.objectMass(o, globalSpace)
+            if props is None:
+                partial = True
+                row = self.layout.row()
+                row.label(text=o.name+" Mass: computing...", icon='OBJECT_DATA')
+                continue
+            if props == -1:
+                partial = True
+                continue
+            parts.append(props)
+            self.addMassRows(o.name, props, scale)
+            row = self.layout.row()
+            row.label(text="OBB: "+self.formatVector([2.0 * e
+                for e in sorted(props.obbExtents, reverse=True)], scale))
+
+        # Local values of different objects are in different spaces,
+        # they can only be combined in global space.
+        if globalSpace and len(parts) > 1 and not partial:
+            total = measure_api.combineMass(parts)
+            self.addMassRows("Total", total, scale)
+            row = self.layout.row()
+            row.label(text="AABB: "+self.formatVector(total.bboxMax - total.bboxMin, scale))
+
+        row = self.layout.row()
+        row.prop(self.scene, "measure_panel_density")
+
+
+    # Display mass, centre of mass and principal moments of inertia.
+    def addMassRows(self, name, props, scale):
+        row = self.layout.row()
+        row.label(text=name+" Mass: "+str(round(props.mass * scale ** 3, PRECISION)), icon='OBJECT_DATA')
+        row = self.layout.row()
+        row.label(text="Centre: "+self.formatVector(props.centre, scale))
+        row = self.layout.row()
+        row.label(text="Inertia: "+self.formatVector(props.principal()[0] * scale ** 5, 1.0, ""))
+
+
+    # Calculate the mass properties of a mesh object (in the
+    # background, None is returned until they are available).
+    def objectMass(self, obj, globalSpace):
+        density = objectDensity(self.scene, obj)
+        key = measureKey(self.scene, obj, "mass", globalSpace) + (density,)
+        props = measureCache.get(key)
+        if props is None and not measureScheduler.isPending(key):
+            matrix = None
+            if globalSpace:
+                matrix = measure_api.objectMatrix(obj)
+            coords, loops, sizes = objectBuffers(self.scene, obj)
+            measureScheduler.submit(key, measure_api.massProperties,
+                coords, loops, sizes, matrix, density)
+        return props
+
+
     # Calculate the surface area of a mesh object.
     # *) Set selectedOnly=1 if you only want to count selected faces.
     # *) Set globalSpace=1 if you want to calculate
     #    the global surface area (object mode).
+    # The area is calculated in the background, None is returned
+    # until the value is available.
     # Note: Be sure you have updated the mesh data before
     #       running this with selectedOnly=1!
     # @todo Support other object types (surfaces, etc...)?
-    # @todo Is there a better way to handle
-    #       global calculation? (transformed mesh)
     def objectSurfaceArea(self, obj, selectedOnly, globalSpace):
         if (obj and obj.type == 'MESH' and obj.data):
-            areaTotal = 0
+            mesh = obj.data
 
-            # Apply transformation if needed.
+            if selectedOnly:
+                return self.selectedFaceArea(obj,
+                    measure_api.faceSelection(mesh), globalSpace)
+
+            key = measureKey(self.scene, obj, "area", globalSpace)
+            areaTotal = measureCache.get(key)
+            if areaTotal is not None or measureScheduler.isPending(key):
+                return areaTotal
+
+            # The global area is calculated from the local coordinates
+            # and the object matrix, the mesh is not copied.
+            matrix = None
             if globalSpace:
-                mesh = obj.data.copy()
-                mesh.transform(obj.matrix)
-            else:
-                mesh = obj.data
+                matrix = measure_api.objectMatrix(obj)
+            factor = self.scene.unit_settings.scale_length ** 2
+
+            # The mesh is measured once for all objects using it.
+            shared = self.sharedMesh(obj)
+            if shared is None or shared == -1:
+                return shared
 
-            # Count the area of all the faces.
-            for face in mesh.faces:
-                if (not selectedOnly
-                    or face.selected):
-                    areaTotal += face.area
+            if matrix is None or measure_api.isSimilarity(matrix):
+                # Cheap, no need for a background job.
+                areaTotal = shared.area(matrix) * factor
+                measureCache.put(key, areaTotal)
+                return areaTotal
 
-            return areaTotal * (self.scene.unit_settings.scale_length ** 2)
+            # Shear or non-uniform scale: the mesh is measured again.
+            measureScheduler.submit(key, scaledJob,
+                shared.area, factor, matrix, objectBuffers(self.scene, obj))
+            return None
 
         # We can not calculate an area for this object.
         return -1
 
 
+    # Calculate the volume of a mesh object.
+    # The volume is calculated in the background, None is returned
+    # until the value is available.
     def objectVolume(self, obj, globalSpace):
         if not (obj and obj.type == 'MESH' and obj.data): 
             return -1
 
-        volume = 0.0
-        mesh = obj.data.copy()
+        key = measureKey(self.scene, obj, "volume", globalSpace)
+        volume = measureCache.get(key)
+        if volume is not None:
+            return volume
+
+        # The mesh is measured once for all objects using it.
+        shared = self.sharedMesh(obj)
+        if shared is None or shared == -1:
+            return shared
+
+        # The global volume is the local volume times det(matrix),
+        # the mesh is not copied.
+        matrix = None
         if globalSpace:
-            mesh.transform(obj.matrix)
-
-        # Change to edit mode and triangulate the copied mesh
-        #self.scene.objects.active = obj
-        #bpy.ops.object.mode_set(mode="EDIT")
-        #bpy.ops.mesh.select_all(action='DESELECT')
-        #bpy.ops.mesh.select_all(action='SELECT')
-        #bpy.ops.mesh.quads_convert_to_tris()
-
-        for face in mesh.faces:
-            if len(face.verts) > 3: return -1
-            volume += mesh.verts[face.verts[0]].co.cross(mesh.verts[face.verts[1]].co).dot(mesh.verts[face.verts[2]].co)
+            matrix = measure_api.objectMatrix(obj)
+
         # blender's natural units are meters. 1m = 1bu. Imperial units use yards.
-        return volume / 6 * (self.scene.unit_settings.scale_length ** 3)
+        volume = shared.volume(matrix) * (self.scene.unit_settings.scale_length ** 3)
+        measureCache.put(key, volume)
+        return volume
+
+
+    # Return the estimated bound of the rounding error of the volume
+    # of a mesh object (see measure_core.SharedMesh), None until the
+    # mesh has been measured.
+    def objectVolumeError(self, obj, globalSpace):
+        shared = self.sharedMesh(obj)
+        if shared is None or shared == -1:
+            return None
+        matrix = None
+        if globalSpace:
+            matrix = measure_api.objectMatrix(obj)
+        return shared.volumeError(matrix) * (self.scene.unit_settings.scale_length ** 3)
+
+
+    # Calculate the area of the selected faces (mask) of a mesh object.
+    # The face areas are calculated once (in the background, None is
+    # returned until then). After that only faces whose selection
+    # changed are added or subtracted.
+    @profiled("selection_area")
+    def selectedFaceArea(self, obj, mask, globalSpace):
+        mesh = obj.data
+        matrix = None
+        matrixKey = None
+        if globalSpace:
+            matrix = measure_api.objectMatrix(obj)
+            matrixKey = matrix.tobytes()
+
+        key = ("selection", mesh.name, matrixKey)
+        version = meshKey(mesh)
+        if measureScheduler.isPending(key):
+            return None
+
+        selection = selectionAreas.get(key)
+        if selection == -1:
+            return -1
+        if selection is None or selection.version != version:
+            coords, loops, sizes = meshBuffers(mesh)
+            if selection is not None and selection.matches(coords, loops, sizes):
+                # Only the selection has changed.
+                selection.version = version
+            else:
+                measureScheduler.submit(key, selectionAreaJob, version,
+                    coords, loops, sizes, matrix, cache=selectionAreas)
+                return None
+
+        return selection.update(mask) * (self.scene.unit_settings.scale_length ** 2)
+
+
+    # Return (index, matrix): the spatial index of a mesh object (see
+    # measure_spatial.SpatialIndex) and, if globalSpace is set, the
+    # matrix that places it in the world. The index is built in local
+    # space, so moving the object does not rebuild it. Only matrices
+    # with shear or non-uniform scale need an index in world space
+    # (matrix None then). It is built in the background, index is
+    # None until then.
+    def spatialIndex(self, obj, globalSpace):
+        matrix = None
+        if globalSpace:
+            matrix = measure_api.objectMatrix(obj)
+        if matrix is not None and not measure_api.isSimilarity(matrix):
+            key = spatialKey(self.scene, obj, matrix)
+            build = matrix
+            matrix = None
+        else:
+            key = spatialKey(self.scene, obj, None)
+            build = None
+        index = spatialIndexes.get(key)
+        if index is None and not measureScheduler.isPending(key):
+            coords, loops, sizes = objectBuffers(self.scene, obj)
+            measureScheduler.submit(key, measure_api.SpatialIndex,
+                coords, loops, sizes, build, cache=spatialIndexes)
+        if index == -1:
+            return None, None
+        return index, matrix
+
+
+    # Display the distance of the closest vertex and closest surface
+    # point of a mesh object to the 3D cursor (given in local or
+    # global space).
+    @profiled("cursor")
+    def addClosestToCursor(self, obj, cursor, globalSpace):
+        index, matrix = self.spatialIndex(obj, globalSpace)
+        scale = self.scene.unit_settings.scale_length
+        if index is None:
+            vertex = surface = None
+        else:
+            if matrix is not None:
+                # Query the local index with the cursor in local space.
+                cursor = measure_api.localPoint(cursor, matrix)
+                scale *= measure_api.similarityScale(matrix)
+            vertex = index.nearestVertex(cursor)[0]
+            surface = index.closestSurfacePoint(cursor)[0]
+
+        row = self.layout.row()
+        row.label(text="Closest vertex: "+self.formatDistance(vertex, scale), icon='VERTEXSEL')
+        row = self.layout.row()
+        row.label(text="Closest surface: "+self.formatDistance(surface, scale), icon='FACESEL')
+
+
+    # Display the PAIRS_SHOWN closest pairs of the objects and the
+    # button to export all distances.
+    @profiled("pairs")
+    def addClosestPairs(self, objs):
+        data = pairData(self.scene, objs)
+        key = ("pairs", PAIRS_SHOWN) + tuple(
+            (name, data[name].tobytes()) for name in sorted(data))
+        pairs = measureCache.get(key)
+        if pairs is None:
+            measureScheduler.submit(key, closestPairsJob, PAIRS_SHOWN, data)
+
+        row = self.layout.row()
+        row.label(text="Closest pairs:")
+        if pairs is None:
+            row = self.layout.row()
+            row.label(text="computing...", icon='ARROW_LEFTRIGHT')
+        elif pairs != -1:
+            scale = self.scene.unit_settings.scale_length
+            for dist, i, j in pairs:
+                row = self.layout.row()
+                row.label(text=objs[i].name + " - " + objs[j].name + ": "
+                    + self.formatDistance(dist, scale),
+                    icon='ARROW_LEFTRIGHT')
+
+        row = self.layout.row()
+        row.prop(self.scene, "measure_panel_pairs", expand=True)
+        row = self.layout.row()
+        row.operator("export_distances", text="Export all distances")
+
+
+    # Display the minimum distance between the surfaces of two
+    # mesh objects (global space).
+    @profiled("surface_distance")
+    def addSurfaceDistance(self, obj1, obj2):
+        index1, matrix1 = self.spatialIndex(obj1, True)
+        index2, matrix2 = self.spatialIndex(obj2, True)
+        dist = None
+        if index1 is not None and index2 is not None:
+            key = ("surface_distance",
+                spatialKey(self.scene, obj1, measure_api.objectMatrix(obj1)),
+                spatialKey(self.scene, obj2, measure_api.objectMatrix(obj2)))
+            dist = measureCache.get(key)
+            if dist is None:
+                measureScheduler.submit(key, surfaceDistanceJob,
+                    index1, index2, matrix1, matrix2)
+
+        row = self.layout.row()
+        row.label(text="Surface distance: "+self.formatDistance(dist,
+            self.scene.unit_settings.scale_length), icon='ARROW_LEFTRIGHT')
+
+
+    # Format a vector of lengths (scaled) for display.
+    def formatVector(self, values, scale, units=None):
+        if units is None:
+            units = self.units()
+        return "(" + ", ".join(str(round(v * scale, PRECISION))
+            for v in values) + ")" + units
+
+
+    # Format a distance for display.
+    def formatDistance(self, value, scale):
+        if value is None:
+            return "computing..."
+        return str(round(value * scale, PRECISION))+self.units()
+
+
+    # Return the local measurements of the mesh of an object (see
+    # measure_core.SharedMesh and objectMeshKey). They are calculated
+    # in the background, None is returned until they are available.
+    def sharedMesh(self, obj):
+        precise = measurePrecise(self.scene)
+        key = objectMeshKey(self.scene, obj) + (precise,)
+        shared = sharedMeshes.get(key)
+        if shared is None and not measureScheduler.isPending(key):
+            # Quads and n-gons are triangulated on the fly.
+            coords, loops, sizes = objectBuffers(self.scene, obj)
+            measureScheduler.submit(key, measure_api.SharedMesh,
+                coords, loops, sizes, precise, cache=sharedMeshes)
+        return shared
+
+
+    # Return the topology check of a mesh object (see
+    # measure_topology.MeshTopology), done once per mesh version in
+    # the background. None is returned until it is available.
+    def meshTopology(self, obj):
+        if not (obj and obj.type == 'MESH' and obj.data):
+            return -1
+        key = ("topology",) + objectMeshKey(self.scene, obj)
+        topology = meshTopologies.get(key)
+        if topology is None and not measureScheduler.isPending(key):
+            coords, loops, sizes = objectBuffers(self.scene, obj)
+            measureScheduler.submit(key, measure_api.MeshTopology,
+                loops, sizes, cache=meshTopologies)
+        return topology
+
+
+    # Display the "reenter_editmode" button.
+    def addUpdateButton(self, text):
+        row = self.layout.row()
+        row.operator("reenter_editmode", text=text)
+
+
+    # Format an area (degree=2) or volume (degree=3) for display.
+    def formatValue(self, value, degree):
+        if value is None:
+            return "computing..."
+        return str(round(value, PRECISION))+self.units(degree)
 
 
     def units(self, degree=0):
@@ -517,14 +1268,177 @@ class VIEW3D_PT_measure(bpy.types.Panel):
             return unit
 
 
+# Debug panel: timings (p50/p95 of the last PROFILE_SIZE draws and
+# background jobs), counters and cache statistics.
+class VIEW3D_PT_measure_profile(bpy.types.Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_label = "Measure Profile"
+    bl_default_closed = True
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        syncProfile(scene)
+
+        row = layout.row()
+        row.prop(scene, "measure_panel_profile")
+        if not measureProfile.enabled:
+            return
+
+        for name, count, p50, p95 in measureProfile.summary():
+            row = layout.row()
+            row.label(text="%s: p50 %.2f ms, p95 %.2f ms (%d)" % (
+                name, 1000.0 * p50, 1000.0 * p95, count))
+        for name, value in sorted(measureProfile.counters.items()):
+            row = layout.row()
+            row.label(text="%s: %d" % (name, value))
+        for name, cache in (("values", measureCache),
+                            ("meshes", sharedMeshes),
+                            ("evaluated", evaluatedMeshes),
+                            ("topologies", meshTopologies),
+                            ("selections", selectionAreas),
+                            ("indexes", spatialIndexes)):
+            row = layout.row()
+            row.label(text="Cache %s: %d hits, %d misses" % (
+                name, cache.hits, cache.misses))
+        row = layout.row()
+        row.label(text="Pending jobs: %d" % measureScheduler.pendingCount())
+
+        row = layout.row()
+        row.operator("dump_measure_profile", text="Print to console")
+
+
+class OBJECT_OT_dump_measure_profile(bpy.types.Operator):
+    bl_label = "Dump Measure Profile"
+    bl_idname = "dump_measure_profile"
+    bl_description = "Print the measure panel timings and counters" \
+        " to the console and start over."
+
+    def execute(self, context):
+        for line in measureProfile.report():
+            print("measure: " + line)
+        measureProfile.reset()
+        return ('FINISHED',)
+
+
+# Scene properties of the panel (defined once in register()).
+PROPERTIES = ("measure_panel_dist", "measure_panel_transform",
+    "measure_panel_pairs", "measure_panel_precise", "measure_panel_mass",
+    "measure_panel_density", "measure_panel_evaluated",
+    "measure_panel_profile")
+
+
+def registerProperties():
+    # Define a temporary attribute for the distance value
+    bpy.types.Scene.FloatProperty(
+        name="Distance",
+        attr="measure_panel_dist",
+        precision=PRECISION,
+        unit="LENGTH")
+
+    TRANSFORM = [
+        ("measure_global", "Global",
+            "Calculate values in global space."),
+        ("measure_local", "Local",
+            "Calculate values inside the local object space.")]
+
+    # Define dropdown for the global/local setting
+    bpy.types.Scene.EnumProperty(
+        attr="measure_panel_transform",
+        name="Space",
+        description="Choose in which space you want to measure.",
+        items=TRANSFORM,
+        default='measure_global')
+
+    PAIRS = [
+        ("pairs_origins", "Origins",
+            "Distances between the object origins."),
+        ("pairs_bounds", "Bounds",
+            "Distances between the object bounding boxes.")]
+
+    # Define dropdown for the object distances (3+ objects)
+    bpy.types.Scene.EnumProperty(
+        attr="measure_panel_pairs",
+        name="Distances",
+        description="Choose how the distance between objects"
+            " is measured.",
+        items=PAIRS,
+        default='pairs_origins')
+
+    # Define checkbox for the precise volume calculation
+    bpy.types.Scene.BoolProperty(
+        attr="measure_panel_precise",
+        name="Precise",
+        description="Re-centre meshes before calculating the volume."
+            " Use this for meshes far away from the origin.",
+        default=False)
+
+    # Define checkbox and default density for the mass properties
+    bpy.types.Scene.BoolProperty(
+        attr="measure_panel_mass",
+        name="Mass Properties",
+        description="Calculate mass, centre of mass, inertia and"
+            " bounding boxes of the selected meshes.",
+        default=False)
+
+    bpy.types.Scene.FloatProperty(
+        attr="measure_panel_density",
+        name="Density",
+        description="Density of objects without a \"density\""
+            " custom property.",
+        default=1.0,
+        min=0.0)
+
+    # Define checkbox for measuring the mesh with modifiers applied
+    bpy.types.Scene.BoolProperty(
+        attr="measure_panel_evaluated",
+        name="Apply Modifiers",
+        description="Measure the final mesh (with modifiers)"
+            " instead of the base mesh.",
+        default=False)
+
+    # Define checkbox for the profiling
+    bpy.types.Scene.BoolProperty(
+        attr="measure_panel_profile",
+        name="Profile",
+        description="Record timings of the measure panel.",
+        default=False)
+
+
+def unregisterProperties():
+    remove = getattr(bpy.types.Scene, "RemoveProperty", None)
+    if remove is not None:
+        for attr in PROPERTIES:
+            remove(attr)
+
+
 def register():
+    registerProperties()
     bpy.types.register(VIEW3D_PT_measure)
+    bpy.types.register(VIEW3D_PT_measure_profile)
     bpy.types.register(OBJECT_OT_reenter_editmode)
+    bpy.types.register(OBJECT_OT_export_distances)
+    bpy.types.register(OBJECT_OT_dump_measure_profile)
 
 
 def unregister():
     bpy.types.unregister(VIEW3D_PT_measure)
     bpy.types.unregister(OBJECT_OT_reenter_editmode)
+    bpy.types.unregister(OBJECT_OT_export_distances)
+    bpy.types.unregister(VIEW3D_PT_measure_profile)
+    bpy.types.unregister(OBJECT_OT_dump_measure_profile)
+    unregisterProperties()
+    measureProfile.enabled = False
+    measureProfile.reset()
+    measureScheduler.shutdown()
+    measureCache.clear()
+    sharedMeshes.clear()
+    meshTopologies.clear()
+    evaluatedMeshes.clear()
+    selectionAreas.clear()
+    spatialIndexes.clear()
 
 #bpy.types.register(VIEW3D_PT_measure)
 #bpy.types.register(OBJECT_OT_reenter_editmode)
@@ -0,0 +1,81 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Tests of measure_api.py.
+"""
+
+import numpy
+import pytest
+
+import measure_api
+import measure_core
+from test_measure_core import (CUBE_COORDS, CUBE_FACES, MATRIX, flatMesh,
+    randomMesh)
+
+
+def testBulk():
+    cube = flatMesh(CUBE_COORDS, CUBE_FACES)
+    scale = numpy.diag([2.0, 2.0, 2.0, 1.0])
+    out = numpy.empty(2)
+    assert measure_api.volumes([cube, cube], [None, scale], out=out) is out
+    assert numpy.allclose(out, (1.0, 8.0))
+    both = measure_api.areasAndVolumes([cube, cube], [scale, MATRIX])
+    assert numpy.allclose(both[0], (24.0, 8.0))
+    assert numpy.allclose(both[1], measure_core.areaAndVolume(*cube,
+        matrix=MATRIX))
+    masks = [numpy.arange(6) < 2, None]
+    assert numpy.allclose(measure_api.areas([cube, cube], masks=masks),
+        (2.0, 6.0))
+
+
+@pytest.mark.parametrize("workers, processes",
+    [(1, False), (4, False), (2, True)])
+def testMeasureBatch(workers, processes):
+    meshes = [randomMesh(20 + n, [3, 4, 5], seed=n)
+        + ((MATRIX if n % 2 else None),) for n in range(10)]
+    areas, volumes, totalArea, totalVolume = measure_api.measureBatch(
+        meshes, workers=workers, chunkSize=3, processes=processes)
+    expected = numpy.array([measure_core.areaAndVolume(*mesh)
+        for mesh in meshes])
+    assert numpy.array_equal(areas, expected[:, 0])
+    assert numpy.array_equal(volumes, expected[:, 1])
+    assert numpy.isclose(totalArea, expected[:, 0].sum())
+    assert numpy.isclose(totalVolume, expected[:, 1].sum())
+
+
+def testMaskedAreas():
+    areas = measure_api.faceAreas(*flatMesh(CUBE_COORDS, CUBE_FACES))
+    masks = numpy.array([[True] * 6, [True, False] * 3])
+    assert numpy.allclose(measure_api.maskedAreas(areas, masks), (6.0, 3.0))
+
+
+def testOutChecked():
+    cube = flatMesh(CUBE_COORDS, CUBE_FACES)
+    with pytest.raises(ValueError):
+        measure_api.volumes([cube], out=numpy.empty(2))
+    with pytest.raises(ValueError):
+        measure_api.volumes([cube], out=numpy.empty(1, dtype=numpy.float32))
+
+
+def testPointDistances():
+    out = numpy.empty(2)
+    measure_api.pointDistances([[0, 0, 0], [1, 1, 1]],
+        [[3, 4, 0], [1, 1, 1]], out=out)
+    assert numpy.allclose(out, (5.0, 0.0))
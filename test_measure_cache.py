@@ -0,0 +1,102 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Tests of measure_cache.py.
+"""
+
+import threading
+
+import numpy
+
+import measure_cache
+
+
+def testCacheLeastRecentlyUsed():
+    cache = measure_cache.MeasureCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def testCacheBytes():
+    cache = measure_cache.MeasureCache(10, maxBytes=1000)
+    cache.put("a", numpy.zeros(50))
+    cache.put("b", (numpy.zeros(50), numpy.zeros(10, dtype=numpy.int32)))
+    assert cache.nbytes == 400 + 400 + 40
+    cache.put("c", numpy.zeros(50))
+    assert "a" not in cache and "b" in cache and "c" in cache
+    # The newest value is kept, even if it is too large.
+    cache.put("d", numpy.zeros(500))
+    assert list(cache.items) == ["d"]
+    assert cache.nbytes == 4000
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def testPercentile():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert measure_cache.percentile(values, 50) == 3.0
+    assert measure_cache.percentile(values, 100) == 5.0
+    assert numpy.isclose(measure_cache.percentile(values, 95),
+        numpy.percentile(values, 95))
+
+
+def testProfile():
+    profile = measure_cache.MeasureProfile(size=3)
+    assert profile.start() is None
+    profile.count("faces", 10)
+    assert profile.counters == {}
+    profile.enabled = True
+    for n in range(5):
+        profile.stop("draw", profile.start())
+    profile.count("faces", 10)
+    (name, count, p50, p95), = profile.summary()
+    assert (name, count) == ("draw", 3)
+    assert len(profile.report()) == 2
+
+
+def testScheduler():
+    cache = measure_cache.MeasureCache()
+    other = measure_cache.MeasureCache()
+    scheduler = measure_cache.MeasureScheduler(cache, workers=2)
+    release = threading.Event()
+    try:
+        scheduler.submit("slow", release.wait, 10)
+        assert scheduler.isPending("slow")
+        assert not scheduler.wait(0.01)
+        scheduler.submit("sum", sum, (1, 2))
+        scheduler.submit("other", sum, (3, 4), cache=other)
+        scheduler.submit("fail", int, "x")
+        release.set()
+        while scheduler.pendingCount():
+            assert scheduler.wait(1.0)
+        assert scheduler.collect() == 4
+        assert not scheduler.wait(0.0)
+        assert cache.get("sum") == 3
+        assert other.get("other") == 7
+        # Failed jobs are stored as -1.
+        assert cache.get("fail") == -1
+    finally:
+        scheduler.shutdown()
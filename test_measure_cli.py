@@ -0,0 +1,138 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Tests of measure_cli.py (without Blender).
+"""
+
+import json
+import os
+
+import measure_cli
+
+
+CUBE_OBJ = """o %s
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+f 1 4 3 2
+f 5 6 7 8
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f 4 1 5 8
+"""
+
+
+# Write a.obj (one cube) and b.obj (two cubes).
+def makeFiles(tmpdir):
+    one = os.path.join(tmpdir, "a.obj")
+    two = os.path.join(tmpdir, "b.obj")
+    with open(one, "w") as f:
+        f.write(CUBE_OBJ % "single")
+    # Two objects using the same vertices (OBJ indices are global).
+    with open(two, "w") as f:
+        f.write(CUBE_OBJ % "first")
+        f.write("o second\n" + "".join(line + "\n"
+            for line in (CUBE_OBJ % "x").splitlines() if line[0] == "f"))
+    return one, two
+
+
+def testMeasure(tmp_path):
+    one, two = makeFiles(str(tmp_path))
+    output = str(tmp_path / "out.jsonl")
+    assert measure_cli.main(["measure_cli.py", "-o", output,
+        str(tmp_path)]) == 0
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["path"], r["object"], r["records"]) for r in records] == [
+        (one, "single", 1), (two, "first", 2), (two, "second", 2)]
+    assert all(abs(r["global_volume"] - 1.0) < 1e-12 for r in records)
+
+
+def testResume(tmp_path):
+    for fmt in ("jsonl", "csv"):
+        one, two = makeFiles(str(tmp_path))
+        output = str(tmp_path / ("out." + fmt))
+        argv = ["measure_cli.py", "-o", output, one, two]
+        measure_cli.main(argv)
+        with open(output, "rb") as f:
+            complete = f.read()
+        lines = complete.splitlines(True)
+
+        # Interrupted in the middle of the second file: its first
+        # record and half of the second one are written.
+        with open(output, "wb") as f:
+            f.write(b"".join(lines[:-1]) + lines[-1][:10])
+        done, keep = measure_cli.scanOutput(output, fmt)
+        assert done == {one}
+        assert keep == len(b"".join(lines[:-2]))
+
+        measure_cli.main(argv)
+        with open(output, "rb") as f:
+            assert f.read() == complete
+
+        # Nothing left to do.
+        measure_cli.main(argv)
+        with open(output, "rb") as f:
+            assert f.read() == complete
+
+
+ASCII_PLY = """ply
+format ascii 1.0
+element vertex 5
+property float x
+property float y
+property float z
+element face 5
+property list uchar int vertex_indices
+end_header
+0 0 0
+1 0 0
+1 1 0
+0 1 0
+0.5 0.5 1
+4 0 3 2 1
+3 0 1 4
+3 1 2 4
+3 2 3 4
+3 3 0 4
+"""
+
+
+# With --stream, files that can not be memory-mapped are read.
+def testStreamFallback(tmp_path):
+    path = str(tmp_path / "pyramid.ply")
+    with open(path, "w") as f:
+        f.write(ASCII_PLY)
+    record, = measure_cli.measureFile(path, stream=True)
+    assert "error" not in record
+    assert abs(record["local_volume"] - 1.0 / 3.0) < 1e-12
+
+    # Broken files still give an error record.
+    path = str(tmp_path / "broken.faces.npy")
+    with open(path, "w") as f:
+        f.write("not numpy")
+    record, = measure_cli.measureFile(path, stream=True)
+    assert "error" in record
@@ -0,0 +1,309 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Tests of measure_core.py (no Blender needed).
+
+The kernels are compared with a plain Python loop over the faces.
+Run with: python -m pytest
+"""
+
+import math
+
+import numpy
+import pytest
+
+import measure_core
+
+
+# Unit cube [0, 1]^3 made of 6 quads facing outwards.
+CUBE_COORDS = [
+    (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+    (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+CUBE_FACES = [
+    (0, 3, 2, 1), (4, 5, 6, 7), (0, 1, 5, 4),
+    (1, 2, 6, 5), (2, 3, 7, 6), (3, 0, 4, 7)]
+
+# Shear and non-uniform scale.
+MATRIX = numpy.array([
+    [1.0, 0.3, 0.0, 2.0],
+    [0.0, 2.0, 0.0, -1.0],
+    [0.2, 0.0, 0.5, 3.0],
+    [0.0, 0.0, 0.0, 1.0]])
+
+
+# Return a mesh (coords, loops, sizes) with the given faces.
+def flatMesh(coords, faces):
+    loops = [i for face in faces for i in face]
+    sizes = [len(face) for face in faces]
+    return (numpy.array(coords, dtype=numpy.float64),
+        numpy.array(loops), numpy.array(sizes))
+
+
+# Random mesh with "count" faces of the given sizes (3 = triangles).
+def randomMesh(count, sizes, seed=1):
+    random = numpy.random.RandomState(seed)
+    sizes = random.choice(sizes, count)
+    coords = random.uniform(-1.0, 1.0, (50, 3))
+    loops = random.randint(0, len(coords), sizes.sum())
+    return coords, loops, sizes
+
+
+# Area of every face: fan triangles, one at a time in plain Python.
+def pythonFaceAreas(coords, loops, sizes, matrix=None):
+    points = [tuple(float(x) for x in co) for co in coords]
+    if matrix is not None:
+        points = [tuple(sum(matrix[r][c] * p[c] for c in range(3))
+            + matrix[r][3] for r in range(3)) for p in points]
+    areas = []
+    start = 0
+    for size in sizes:
+        face = [points[i] for i in loops[start:start + size]]
+        start += size
+        area = 0.0
+        for k in range(1, size - 1):
+            a = [face[k][j] - face[0][j] for j in range(3)]
+            b = [face[k + 1][j] - face[0][j] for j in range(3)]
+            n = (a[1] * b[2] - a[2] * b[1],
+                 a[2] * b[0] - a[0] * b[2],
+                 a[0] * b[1] - a[1] * b[0])
+            area += 0.5 * math.sqrt(n[0] ** 2 + n[1] ** 2 + n[2] ** 2)
+        areas.append(area)
+    return areas
+
+
+@pytest.mark.parametrize("sizes", [(3,), (4,), (3, 4), (3, 5, 8)])
+def testFaceAreas(sizes):
+    coords, loops, sizes = randomMesh(200, sizes)
+    expected = pythonFaceAreas(coords, loops, sizes)
+    assert numpy.allclose(measure_core.faceAreas(coords, loops, sizes),
+        expected)
+    assert math.isclose(measure_core.surfaceArea(coords, loops, sizes),
+        sum(expected), rel_tol=1e-12)
+
+
+@pytest.mark.parametrize("sizes", [(3,), (4,), (3, 4, 6)])
+def testFaceAreasMatrix(sizes):
+    coords, loops, sizes = randomMesh(200, sizes)
+    expected = pythonFaceAreas(coords, loops, sizes, MATRIX)
+    assert numpy.allclose(
+        measure_core.faceAreas(coords, loops, sizes, MATRIX), expected)
+    assert math.isclose(
+        measure_core.surfaceArea(coords, loops, sizes, matrix=MATRIX),
+        sum(expected), rel_tol=1e-12)
+
+
+@pytest.mark.parametrize("sizes", [(3,), (4,), (3, 4, 5)])
+def testSurfaceAreaMask(sizes):
+    coords, loops, sizes = randomMesh(300, sizes)
+    mask = numpy.random.RandomState(2).rand(len(sizes)) < 0.3
+    areas = pythonFaceAreas(coords, loops, sizes)
+    expected = sum(a for a, m in zip(areas, mask) if m)
+    assert math.isclose(
+        measure_core.surfaceArea(coords, loops, sizes, mask),
+        expected, rel_tol=1e-12)
+    assert measure_core.surfaceArea(coords, loops, sizes,
+        numpy.zeros(len(sizes), dtype=bool)) == 0.0
+
+
+def testFaceAreasOut():
+    coords, loops, sizes = randomMesh(100, (3, 4))
+    out = numpy.full(len(sizes), 7.0)
+    result = measure_core.faceAreas(coords, loops, sizes, out=out)
+    assert result is out
+    assert numpy.allclose(out, pythonFaceAreas(coords, loops, sizes))
+
+
+# Blender exports float32 coordinates and int32 indices.
+def testBlenderBuffers():
+    coords, loops, sizes = randomMesh(100, (3, 4, 5))
+    expected = measure_core.faceAreas(coords.astype(numpy.float32),
+        loops, sizes)
+    areas = measure_core.faceAreas(coords.astype(numpy.float32).ravel(),
+        loops.astype(numpy.int32), sizes.astype(numpy.int32))
+    assert numpy.array_equal(areas, expected)
+    assert numpy.allclose(areas, pythonFaceAreas(coords, loops, sizes),
+        rtol=1e-5)
+
+
+# Chunks must not change the triangulation.
+def testFanTrianglesChunks():
+    coords, loops, sizes = randomMesh(100, (3, 4, 7))
+    whole = [numpy.concatenate(parts) for parts in
+        zip(*measure_core.fanTriangles(loops, sizes))]
+    chunked = [numpy.concatenate(parts) for parts in
+        zip(*measure_core.fanTriangles(loops, sizes, chunkSize=7))]
+    assert len(whole[0]) == (sizes - 2).sum()
+    for a, b in zip(whole, chunked):
+        assert numpy.array_equal(a, b)
+
+
+def testFacesFromRaw():
+    loops, sizes = measure_core.facesFromRaw([1, 2, 3, 0, 4, 5, 6, 7])
+    assert list(loops) == [1, 2, 3, 4, 5, 6, 7]
+    assert list(sizes) == [3, 4]
+
+
+def testCubeVolume():
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    assert math.isclose(measure_core.signedVolume(coords, loops, sizes), 1.0)
+    assert math.isclose(
+        measure_core.signedVolume(coords, loops, sizes, MATRIX),
+        numpy.linalg.det(MATRIX[:3, :3]))
+    area, volume = measure_core.areaAndVolume(coords, loops, sizes)
+    assert math.isclose(area, 6.0)
+    assert math.isclose(volume, 1.0)
+    # Faces pointing inwards give a negative volume.
+    flipped = flatMesh(CUBE_COORDS, [face[::-1] for face in CUBE_FACES])
+    assert math.isclose(measure_core.signedVolume(*flipped), -1.0)
+
+
+def testPreciseVolume():
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    # Exactly representable: side 2^-10, 2^20 away from the origin.
+    side = 2.0 ** -10
+    far = coords * side + 2.0 ** 20
+    area, volume, areaError, volumeError = \
+        measure_core.preciseAreaAndVolume(far, loops, sizes)
+    assert abs(volume - side ** 3) <= volumeError
+    assert abs(area - 6 * side ** 2) <= areaError
+    assert 0.0 < volumeError < 1e-12 * side ** 3
+
+
+def testSharedMesh():
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    shared = measure_core.SharedMesh(coords, loops, sizes)
+    scale = numpy.diag([2.0, 2.0, 2.0, 1.0])
+    assert math.isclose(shared.area(scale), 24.0)
+    assert math.isclose(shared.volume(scale), 8.0)
+    expected = measure_core.surfaceArea(coords, loops, sizes, matrix=MATRIX)
+    assert math.isclose(shared.area(MATRIX, (coords, loops, sizes)),
+        expected)
+    with pytest.raises(ValueError):
+        shared.area(MATRIX)
+
+
+def testIsSimilarity():
+    assert measure_core.isSimilarity(numpy.diag([1e-5, 1e-5, 1e-5, 1.0]))
+    assert not measure_core.isSimilarity(
+        numpy.diag([1e-5, 3e-5, 1e-5, 1.0]))
+    assert not measure_core.isSimilarity(
+        numpy.diag([0.001, 0.001, 0.001005, 1.0]))
+    assert not measure_core.isSimilarity(numpy.zeros((4, 4)))
+    assert not measure_core.isSimilarity(MATRIX)
+
+
+def testMassProperties():
+    # Box 2 x 4 x 6 (cube scaled), density 3.
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    matrix = numpy.diag([2.0, 4.0, 6.0, 1.0])
+    matrix[:3, 3] = (1.0, 2.0, 3.0)
+    props = measure_core.massProperties(coords, loops, sizes, matrix, 3.0)
+    mass = 3.0 * 48.0
+    assert math.isclose(props.volume, 48.0)
+    assert math.isclose(props.mass, mass)
+    assert numpy.allclose(props.centre, (2.0, 4.0, 6.0))
+    expected = mass / 12.0 * numpy.array([4 ** 2 + 6 ** 2,
+        2 ** 2 + 6 ** 2, 2 ** 2 + 4 ** 2])
+    assert numpy.allclose(props.inertia, numpy.diag(expected))
+    assert numpy.allclose(props.bboxMin, (1.0, 2.0, 3.0))
+    assert numpy.allclose(props.bboxMax, (3.0, 6.0, 9.0))
+    assert numpy.allclose(sorted(props.obbExtents), (1.0, 2.0, 3.0))
+
+    total = measure_core.combineMass([props, props])
+    assert math.isclose(total.mass, 2 * mass)
+    assert numpy.allclose(total.inertia, 2 * props.inertia)
+
+
+# A mirrored object has the same mass properties as its twin.
+def testMassPropertiesMirrored():
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    mirrored = numpy.diag([-1.0, 2.0, 3.0, 1.0])
+    props = measure_core.massProperties(coords, loops, sizes, mirrored)
+    assert math.isclose(props.mass, 6.0)
+    assert numpy.allclose(props.centre, (-0.5, 1.0, 1.5))
+    assert numpy.allclose(props.inertia,
+        numpy.diag([13.0, 10.0, 5.0]) / 2.0)
+
+    twin = measure_core.massProperties(coords, loops, sizes,
+        numpy.diag([1.0, 2.0, 3.0, 1.0]))
+    total = measure_core.combineMass([props, twin])
+    assert math.isclose(total.mass, 12.0)
+    assert numpy.allclose(total.centre, (0.0, 1.0, 1.5))
+
+
+def testStreamMeasure():
+    coords, loops, sizes = flatMesh(CUBE_COORDS, CUBE_FACES)
+    faces = loops.reshape(-1, 4)
+    area, volume, low, high = measure_core.streamMeasure(coords, faces,
+        chunkSize=4)
+    assert math.isclose(area, 6.0)
+    assert math.isclose(volume, 1.0)
+    assert numpy.allclose(low, 0.0) and numpy.allclose(high, 1.0)
+
+    # Triangle soup, like binary STL files.
+    triangles = numpy.concatenate([coords[faces[:, [0, 1, 2]]],
+        coords[faces[:, [0, 2, 3]]]])
+    area, volume = measure_core.streamMeasure(triangles)[:2]
+    assert math.isclose(area, 6.0)
+    assert math.isclose(volume, 1.0)
+
+
+def testMeasureInstances():
+    cube = flatMesh(CUBE_COORDS, CUBE_FACES)
+    scale = numpy.diag([2.0, 2.0, 2.0, 1.0])
+    areas, volumes = measure_core.measureInstances({"cube": cube},
+        [("cube", None), ("cube", scale), ("cube", MATRIX)])
+    assert numpy.allclose(areas[:2], (6.0, 24.0))
+    assert math.isclose(areas[2],
+        measure_core.surfaceArea(*cube, matrix=MATRIX))
+    assert numpy.allclose(volumes,
+        (1.0, 8.0, numpy.linalg.det(MATRIX[:3, :3])))
+
+
+def testSelectionArea():
+    coords, loops, sizes = randomMesh(50, (3, 4))
+    areas = pythonFaceAreas(coords, loops, sizes)
+    selection = measure_core.SelectionArea(coords, loops, sizes)
+    random = numpy.random.RandomState(3)
+    for step in range(5):
+        mask = random.rand(len(sizes)) < 0.5
+        expected = sum(a for a, m in zip(areas, mask) if m)
+        assert math.isclose(selection.update(mask), expected)
+    assert selection.matches(coords, loops, sizes)
+
+
+# Stand-in for a Blender 2.5 mesh (mesh.verts[i].co).
+class FakeVertex(object):
+    def __init__(self, co):
+        self.co = co
+
+
+class FakeMesh(object):
+    def __init__(self, coords):
+        self.verts = [FakeVertex(tuple(co)) for co in coords]
+
+
+def testMeshFingerprint():
+    coords = numpy.random.RandomState(4).rand(1000, 3)
+    fingerprint = measure_core.meshFingerprint(FakeMesh(coords))
+    assert measure_core.meshFingerprint(FakeMesh(coords)) == fingerprint
+    # Applied scale changes every vertex.
+    assert measure_core.meshFingerprint(FakeMesh(coords * 2.0)) != fingerprint
+    assert measure_core.meshFingerprint(FakeMesh([])) == \
+        measure_core.meshFingerprint(FakeMesh([]))
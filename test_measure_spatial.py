@@ -0,0 +1,133 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Tests of measure_spatial.py.
+"""
+
+import math
+
+import numpy
+
+import measure_spatial
+from test_measure_core import CUBE_COORDS, CUBE_FACES, flatMesh
+
+
+def testKDTree():
+    random = numpy.random.RandomState(1)
+    points = random.uniform(-1.0, 1.0, (500, 3))
+    tree = measure_spatial.KDTree(points, leafSize=8)
+    for query in random.uniform(-1.5, 1.5, (20, 3)):
+        dist = numpy.linalg.norm(points - query, axis=1)
+        assert tree.nearest(query) == (dist.min(), dist.argmin())
+        found = tree.within(query, 0.3)
+        assert sorted(found) == sorted(numpy.flatnonzero(dist <= 0.3))
+
+
+def testClosestSurfacePoint():
+    index = measure_spatial.SpatialIndex(*flatMesh(CUBE_COORDS, CUBE_FACES))
+    # Above the middle of the top face, no vertex is that close.
+    dist, location = index.closestSurfacePoint((0.5, 0.5, 1.5))
+    assert math.isclose(dist, 0.5)
+    assert numpy.allclose(location, (0.5, 0.5, 1.0))
+    assert math.isclose(index.nearestVertex((0.1, 0.1, 1.1))[0],
+        math.sqrt(0.03))
+
+
+def testSurfaceDistance():
+    cube = flatMesh(CUBE_COORDS, CUBE_FACES)
+    matrix = numpy.eye(4)
+    matrix[:3, 3] = (3.0, 0.2, 0.1)
+    indexA = measure_spatial.SpatialIndex(*cube)
+    indexB = measure_spatial.SpatialIndex(*cube, matrix=matrix)
+    dist, pointA, pointB = measure_spatial.surfaceDistance(indexA, indexB)
+    assert math.isclose(dist, 2.0)
+    assert math.isclose(pointB[0] - pointA[0], 2.0)
+
+
+# A mesh inside the bounding box of the other one (an object in a
+# room): no vertex can be skipped by its distance to the other box.
+def testSurfaceDistanceNested():
+    random = numpy.random.RandomState(3)
+    directions = random.normal(size=(3000, 3))
+    inner = directions / numpy.linalg.norm(directions, axis=1)[:, None]
+    inner = inner * 0.4 + (0.55, 0.5, 0.5)
+    loops = random.randint(0, len(inner), 3 * 2000)
+    sizes = numpy.full(2000, 3)
+    indexA = measure_spatial.SpatialIndex(inner, loops, sizes)
+    indexB = measure_spatial.SpatialIndex(*flatMesh(CUBE_COORDS, CUBE_FACES))
+    dist, pointA, pointB = measure_spatial.surfaceDistance(indexA, indexB)
+    # The closest wall of the unit cube.
+    expected = numpy.minimum(inner, 1.0 - inner).min()
+    assert math.isclose(dist, expected)
+    assert math.isclose(numpy.linalg.norm(pointA - pointB), expected)
+    assert math.isclose(
+        measure_spatial.surfaceDistance(indexB, indexA)[0], expected)
+
+
+def testDistanceMatrix():
+    random = numpy.random.RandomState(2)
+    points = random.rand(300, 3)
+    matrix = measure_spatial.distanceMatrix(points)
+    expected = numpy.linalg.norm(points[:, None] - points[None], axis=2)
+    assert numpy.allclose(matrix, expected)
+
+    upper = numpy.triu_indices(len(points), 1)
+    order = numpy.argsort(expected[upper])[:5]
+    pairs = measure_spatial.closestPairs(5, points)
+    assert [(i, j) for d, i, j in pairs] == [
+        (upper[0][n], upper[1][n]) for n in order]
+
+
+def testBoxDistances():
+    lows = numpy.array([[0.0, 0, 0], [2, 0, 0], [0.5, 0.5, 0.5]])
+    highs = lows + 1.0
+    matrix = measure_spatial.distanceMatrix(lows=lows, highs=highs)
+    assert numpy.allclose(matrix[0], (0.0, 1.0, 0.0))
+
+
+# Local indexes placed with matrices give the same result as indexes
+# built in world space.
+def testSurfaceDistanceMatrices():
+    cube = flatMesh(CUBE_COORDS, CUBE_FACES)
+    angle = 0.3
+    matrixA = numpy.eye(4)
+    matrixA[:3, :3] = 2.0 * numpy.array([
+        [math.cos(angle), -math.sin(angle), 0.0],
+        [math.sin(angle), math.cos(angle), 0.0],
+        [0.0, 0.0, 1.0]])
+    matrixB = numpy.diag([0.5, 0.5, 0.5, 1.0])
+    matrixB[:3, 3] = (4.0, 1.0, 0.3)
+    world = measure_spatial.surfaceDistance(
+        measure_spatial.SpatialIndex(*cube, matrix=matrixA),
+        measure_spatial.SpatialIndex(*cube, matrix=matrixB))
+    local = measure_spatial.SpatialIndex(*cube)
+    placed = measure_spatial.surfaceDistance(local, local,
+        matrixA=matrixA, matrixB=matrixB)
+    assert math.isclose(placed[0], world[0])
+    assert numpy.allclose(placed[1], world[1])
+    assert numpy.allclose(placed[2], world[2])
+
+
+def testLocalPoint():
+    matrix = numpy.diag([2.0, 2.0, 2.0, 1.0])
+    matrix[:3, 3] = (1.0, 0.0, 0.0)
+    assert numpy.allclose(measure_spatial.localPoint((3.0, 2.0, 0.0),
+        matrix), (1.0, 1.0, 0.0))
+    assert math.isclose(measure_spatial.similarityScale(matrix), 2.0)
@@ -0,0 +1,73 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Tests of measure_topology.py.
+"""
+
+import numpy
+
+import measure_topology
+from test_measure_core import CUBE_FACES
+
+
+def topology(faces):
+    loops = numpy.array([i for face in faces for i in face])
+    sizes = numpy.array([len(face) for face in faces])
+    return measure_topology.MeshTopology(loops, sizes)
+
+
+def testClosedCube():
+    cube = topology(CUBE_FACES)
+    assert cube.reliable
+    assert len(cube.edges) == 12
+    assert cube.partCount == 1
+    assert cube.problems() == ""
+
+
+def testHole():
+    cube = topology(CUBE_FACES[1:])
+    assert not cube.reliable
+    assert cube.boundaryEdges == 4
+    assert cube.flippedEdges == 0
+
+
+def testFlippedFace():
+    faces = list(CUBE_FACES)
+    faces[0] = faces[0][::-1]
+    cube = topology(faces)
+    assert not cube.reliable
+    assert cube.flippedEdges == 4
+    assert cube.flippedRegions == 1
+    assert cube.flippedFaces == 1
+    assert "flipped" in cube.problems()
+
+
+def testNonManifold():
+    # Three triangles sharing the edge (0, 1).
+    mesh = topology([(0, 1, 2), (1, 0, 3), (0, 1, 4)])
+    assert mesh.nonManifoldEdges == 1
+    assert not mesh.reliable
+
+
+def testSeparateParts():
+    other = [tuple(i + 8 for i in face) for face in CUBE_FACES]
+    cubes = topology(list(CUBE_FACES) + other)
+    assert cubes.reliable
+    assert cubes.partCount == 2